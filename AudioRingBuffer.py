@@ -0,0 +1,109 @@
+import threading
+from collections import deque
+
+import numpy as np
+
+POLICIES = ["drop_oldest", "coalesce", "block"]
+
+
+class AudioRingBuffer:
+    """Bounded queue of int16 audio blocks, stored in one preallocated array.
+
+    When the reader falls behind and every slot is full, the policy decides:
+    drop_oldest: the oldest unread block is dropped to make room
+    coalesce: blocks are appended to the newest unread slot while it has room, then the oldest is dropped
+    block: the writer waits for the reader
+    The slot the reader holds is never written to, so a block from get() stays intact until the next get().
+    """
+
+    def __init__(self, capacity=32, block_frames=8196, channels=1, policy="drop_oldest", slot_blocks=4):
+        if policy not in POLICIES:
+            raise ValueError("unknown queue policy: " + str(policy))
+        if capacity < 2:
+            raise ValueError("an audio ring buffer needs at least 2 slots")
+        self.capacity = capacity
+        self.policy = policy
+        # coalescing slots hold several blocks each
+        slot_samples = block_frames * channels * (slot_blocks if policy == "coalesce" else 1)
+        self.buffer = np.zeros((capacity, slot_samples), dtype=np.int16)
+        self.lengths = [0] * capacity
+        self.captured = [0.0] * capacity
+
+        # slots free to write, unread slots oldest first, slot the reader currently holds
+        self.free = deque(range(capacity))
+        self.unread = deque()
+        self.reading = None
+        self.condition = threading.Condition()
+        self.closed = False
+
+        self.written = 0
+        self.dropped = 0
+        self.coalesced = 0
+        # blocks the writer had to wait for, with the block policy
+        self.late = 0
+
+    def full(self):
+        return not self.free
+
+    def put(self, data, captured=0.0):
+        # data is any int16 buffer (e.g. a sounddevice callback buffer), copied into a free slot
+        samples = np.frombuffer(data, dtype=np.int16)
+        with self.condition:
+            if self.closed:
+                return
+            self.written += 1
+
+            if self.full() and self.policy == "coalesce" and self.unread:
+                newest = self.unread[-1]
+                length = self.lengths[newest]
+                if length + len(samples) <= self.buffer.shape[1]:
+                    self.buffer[newest, length:length + len(samples)] = samples
+                    self.lengths[newest] = length + len(samples)
+                    self.coalesced += 1
+                    self.condition.notify_all()
+                    return
+
+            if self.full():
+                if self.policy == "block":
+                    self.late += 1
+                    self.condition.wait_for(lambda: not self.full() or self.closed)
+                    if self.closed:
+                        return
+                else:
+                    # the oldest unread slot is reused for the new block
+                    self.free.append(self.unread.popleft())
+                    self.dropped += 1
+
+            slot = self.free.popleft()
+            length = min(len(samples), self.buffer.shape[1])
+            self.buffer[slot, :length] = samples[:length]
+            self.lengths[slot] = length
+            self.captured[slot] = captured
+            self.unread.append(slot)
+            self.condition.notify_all()
+
+    def get(self, timeout=None):
+        # (captured, samples) of the oldest block, samples is a view into the buffer that stays
+        # valid until the next get(); None on timeout or once closed and empty
+        with self.condition:
+            if self.reading is not None:
+                self.free.append(self.reading)
+                self.reading = None
+                self.condition.notify_all()
+            if not self.condition.wait_for(lambda: self.unread or self.closed, timeout) or not self.unread:
+                return None
+            slot = self.unread.popleft()
+            self.reading = slot
+            return self.captured[slot], self.buffer[slot, :self.lengths[slot]]
+
+    def qsize(self):
+        return len(self.unread)
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def stats(self):
+        return {"written": self.written, "dropped": self.dropped, "coalesced": self.coalesced,
+                "late": self.late, "depth": len(self.unread)}
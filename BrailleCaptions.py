@@ -1,15 +1,30 @@
 import numpy as np
-import cv2 # opencv-python in package manager
 import textwrap
+import threading
+from functools import lru_cache
 from PIL import Image, ImageFont, ImageDraw # Pillow in package manager
+from GlyphAtlas import GlyphAtlas, BRAILLE_CELLS, ASCII_CHARS
+from CaptionModel import CaptionModel
+from FrameSource import FrameGrabber
+from Metrics import metrics
 
 
 class BrailleVideoCaptions:
 
-    def __init__(self, encoder=None, stt = None):
+    def __init__(self, encoder=None, stt = None, renderer="pil", layout="wrap"):
         self.running = False
         self.terminated = False
         self.speech_text = "def"
+        # when the audio behind speech_text was captured, for the speech to caption latency
+        self.speech_captured = None
+        # draw live metrics over the video
+        self.hud = False
+        self.hud_lines, self.hud_updated = [], 0
+        # the window shows frames resized by this much, captions are still drawn at full resolution
+        self.display_scale = 1
+        self.display_buffer = None
+        # scratch space for blendOverlay, one per thread as video files are blended on a pool
+        self.blend_buffers = threading.local()
         self.displayWindowName = "Live Braille Transcription"
         self.encoder = encoder
         self.stt = stt
@@ -24,111 +39,369 @@ class BrailleVideoCaptions:
         self.alpha_font = ImageFont.truetype("./Inter-Medium.ttf", self.font_size)
         self.braille_font = ImageFont.truetype("./SimBraille.ttf", self.font_size)
 
+        # "pil" draws captions with ImageDraw, "atlas" composes them from pre-rasterized glyphs
+        if renderer not in ("pil", "atlas"):
+            raise ValueError("unknown caption renderer: " + str(renderer))
+        self.renderer = renderer
+        if renderer == "atlas":
+            self.braille_atlas = GlyphAtlas("./SimBraille.ttf", self.font_size, BRAILLE_CELLS)
+            self.alpha_atlas = GlyphAtlas("./Inter-Medium.ttf", self.font_size, ASCII_CHARS)
+            render = self.renderAtlasOverlay
+        else:
+            render = self.renderCaptionOverlay
+
+        # "wrap" wraps the whole caption every update, "words" keeps laid out lines of words in a CaptionModel
+        # and scrolls finished lines out; speech_text is then a tuple of (text, braille) lines
+        if layout not in ("wrap", "words"):
+            raise ValueError("unknown caption layout: " + str(layout))
+        self.caption_model = None
+        # pixel width of a caption line, set from the frame width once video starts
+        self.caption_width = 640
+        if layout == "words":
+            self.caption_model = CaptionModel(self.encoder,
+                                              lru_cache(maxsize=4096)(self.alpha_font.getlength),
+                                              lru_cache(maxsize=4096)(self.braille_font.getlength),
+                                              self.caption_width)
+
+        # stages shown on the hud, as p50/p99
+        self.hud_stages = ["speech_to_caption", "accept_waveform", "partial_results", "encode_text",
+                           "caption_layout", "caption_render", "captions", "display", "camera_read"]
+
+        # rendered caption overlays, keyed on text and frame size
+        self.overlay_cache_size = 16
+        self.captionOverlay = lru_cache(maxsize=self.overlay_cache_size)(render)
+
     def speechToText(self):
-        while True:
-            if self.running:
-                if self.stt is not None:
-                    self.speech_text = self.stt.partial_text
-            if self.terminated:
+        # sleep until the recognizer publishes a new transcript, or shuts down
+        if self.stt is None:
+            return
+        version = 0
+        while not self.terminated:
+            updates = self.stt.channel.wait(version, timeout=1)
+            if updates is None:
                 break
+            if updates:
+                version = updates[-1].version
+                self.speech_captured = updates[-1].captured
+                if self.caption_model is None:
+                    self.speech_text = updates[-1].text
+                    continue
 
-    def videoCaptioning(self):
-        # set the width and height, and UNSUCCESSFULLY set the exposure time
-        cam = cv2.VideoCapture(0)
-        cam.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc('M', 'J', 'P', 'G'))  # depends on fourcc available camera
-        cam.set(cv2.CAP_PROP_FRAME_WIDTH, cam.get(cv2.CAP_PROP_FRAME_WIDTH))
-        cam.set(cv2.CAP_PROP_FRAME_HEIGHT, cam.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        # cam.set(cv2.CAP_PROP_FRAME_WIDTH, 1920)
-        # cam.set(cv2.CAP_PROP_FRAME_HEIGHT, 1080)
-        cam.set(cv2.CAP_PROP_FPS, cam.get(cv2.CAP_PROP_FPS))
+                start = metrics.clock()
+                if self.caption_model.max_width != self.caption_width:
+                    self.caption_model.set_width(self.caption_width)
+                for i, update in enumerate(updates):
+                    # finished sentences stay on screen until they scroll out, even if a partial overtook them
+                    if update.final or i == len(updates) - 1:
+                        self.caption_model.update(update.text, update.final, update.words)
+                self.speech_text = self.caption_model.visible()
+                metrics.record("caption_layout", start)
 
-        # read recording
-        flag, frame = cam.read()
+    def wrapCaption(self, caption):
+        # (text lines, braille lines) of laid out caption model lines, or of text wrapped here
+        if isinstance(caption, tuple):
+            return [text for text, _ in caption], [braille for _, braille in caption]
+        return textwrap.wrap(caption, self.line_length), textwrap.wrap(self.encoder.encode_text(caption), self.line_length)
 
-        # get width and height
-        width, height = np.size(frame, 1), np.size(frame, 0)
+    def captionLines(self, speech_text, width, height):
+        # (text, font, x, y, ink box) of every caption line, positioned on a frame of width x height
+        wrapped_speech, wrapped_translation = self.wrapCaption(speech_text)
+        lines = []
 
-        print("Starting Transcriber...")
+        # if silence
+        if wrapped_translation == []:
+            return lines
 
-        while True:
-            # start recording
-            ret, img = cam.read()
-            self.running = True
+        default_braille_height = self.braille_font.getbbox(wrapped_translation[0])[3]
+        default_braille_row_gap = default_braille_height + round(default_braille_height * 0.5) + round(default_braille_height * 0.25)
+        default_text_height = self.braille_font.getbbox(wrapped_speech[0])[3]
+
+        # BRAILLE CAPTIONS
+
+        # start position for braille captions
+        translation_start_y = height - (default_braille_row_gap * len(wrapped_translation)) - default_braille_row_gap
+
+        for i in range(0, len(wrapped_translation)):
+            # get size/position values
+            text_size = self.braille_font.getbbox(str(wrapped_translation[i]))
+            _, _, text_w, text_h = text_size
+
+            # position
+            x = round(width / 2) - round(text_w / 2)
+            y = translation_start_y + (i * (text_h + round(text_h * 0.5))) + text_h
+            lines.append((wrapped_translation[i], self.braille_font, x, y, self.offsetBox(text_size, x, y)))
+
+        # TEXT CAPTIONS
+
+        # start position for text captions
+        text_start_y = translation_start_y - (default_braille_row_gap * len(wrapped_speech))
+
+        for i in range(0, len(wrapped_speech)):
+            # get size/position values
+            text_size = self.alpha_font.getbbox(str(wrapped_speech[i]))
+            _, _, text_w, _ = text_size
+
+            # position
+            x = round(width / 2) - round(text_w / 2)
+            y = text_start_y + (i * (default_text_height + round(default_text_height * 0.75))) + default_text_height
+            lines.append((wrapped_speech[i], self.alpha_font, x, y, self.offsetBox(text_size, x, y)))
+
+        return lines
+
+    def offsetBox(self, box, x, y):
+        # a font.getbbox box of text drawn at (x, y), as draw.textbbox gives it
+        return box[0] + x, box[1] + y, box[2] + x, box[3] + y
+
+    def captionBand(self, lines, width, height):
+        # (x0, y0, x1, y1) around every line's background box, clipped to the frame
+        margin = self.edges_margin
+        # rounded_rectangle includes its far edges
+        x0 = max(min(box[0] for *_, box in lines) - margin, 0)
+        y0 = max(min(box[1] for *_, box in lines) - margin, 0)
+        x1 = min(max(box[2] for *_, box in lines) + margin + 1, width)
+        y1 = min(max(box[3] for *_, box in lines) + margin + 1, height)
+        return x0, y0, x1, y1
 
-            # mirror camera
-            img = cv2.flip(img, 1)
+    def drawCaptions(self, layers, text_mask, lines, left=0, top=0):
+        # lines from captionLines, on canvases whose origin is at (left, top) of the frame: the background
+        # boxes are drawn on every layer, the text rasterized once into text_mask and then filled in on each
+        draws = [ImageDraw.Draw(layer, "RGBA") for layer in layers]
+        mask_draw = ImageDraw.Draw(text_mask)
+        margin = self.edges_margin
+        for text, font, x, y, box in lines:
+            for draw in draws:
+                draw.rounded_rectangle((box[0] - left - margin, box[1] - top - margin, box[2] - left + margin, box[3] - top + margin), fill=self.bg_color, radius = self.edges_curve_radius)
+            mask_draw.text((x - left, y - top), text, font=font, fill=255)
+        for layer in layers:
+            layer.paste(self.text_color, mask=text_mask)
 
-            # convert to pillow format
-            img_pil = Image.fromarray(img)
-            draw = ImageDraw.Draw(img_pil, "RGBA")
+    def renderCaptionOverlay(self, speech_text, width, height):
+        # draw the captions over black and over white: over black gives the premultiplied caption colour,
+        # the difference between the two gives how much of the frame shows through each pixel.
+        # only the band the caption boxes cover is drawn, worked out from the line metrics first
+        start = metrics.clock()
+        lines = self.captionLines(speech_text, width, height)
+        if not lines:
+            return None
+        x0, y0, x1, y1 = self.captionBand(lines, width, height)
+        if x1 <= x0 or y1 <= y0:
+            return None
+        size = (x1 - x0, y1 - y0)
+        layers = [Image.new("RGB", size, (background, background, background)) for background in (0, 255)]
+        self.drawCaptions(layers, Image.new("L", size, 0), lines, x0, y0)
+        color = np.asarray(layers[0], dtype=np.int16)
+        transmit = np.clip(np.asarray(layers[1], dtype=np.int16) - color, 0, 255)
+        metrics.record("caption_render", start)
+        # frames are BGR, the layers RGB
+        return (y0, y1, x0, x1,
+                np.ascontiguousarray(color[:, :, ::-1], dtype=np.uint16),
+                np.ascontiguousarray(transmit[:, :, ::-1], dtype=np.uint16))
 
+    def renderAtlasOverlay(self, speech_text, width, height):
+        # same layout as drawCaptions, with every line composed from the glyph atlases
+        start = metrics.clock()
+        wrapped_speech, wrapped_translation = self.wrapCaption(speech_text)
 
-            # translate text
-            wrapped_speech = textwrap.wrap(self.speech_text, self.line_length)
-            wrapped_translation = textwrap.wrap(self.encoder.encode_text(self.speech_text), self.line_length)
+        # if silence
+        if wrapped_translation == []:
+            return None
 
-            # if not silence
-            if wrapped_translation != []:
-                default_braille_height = self.braille_font.getbbox(wrapped_translation[0])[3]
-                default_braille_row_gap = default_braille_height + round(default_braille_height * 0.5) + round(default_braille_height * 0.25)
-                default_text_height = self.braille_font.getbbox(wrapped_speech[0])[3]
+        default_braille_height = self.braille_atlas.measure(wrapped_translation[0])[3]
+        default_braille_row_gap = default_braille_height + round(default_braille_height * 0.5) + round(default_braille_height * 0.25)
+        default_text_height = self.braille_atlas.measure(wrapped_speech[0])[3]
 
-                # BRAILLE CAPTIONS
+        # (line coverage, x, y) of every line's ink box
+        lines = []
 
-                # start position for braille captions
-                translation_start_y = height - (default_braille_row_gap * len(wrapped_translation)) - default_braille_row_gap
+        # BRAILLE CAPTIONS
+        translation_start_y = height - (default_braille_row_gap * len(wrapped_translation)) - default_braille_row_gap
+        for i in range(0, len(wrapped_translation)):
+            coverage, (left, top, text_w, text_h) = self.braille_atlas.compose(wrapped_translation[i])
+            x = round(width / 2) - round(text_w / 2)
+            y = translation_start_y + (i * (text_h + round(text_h * 0.5)))
+            lines.append((coverage, x + left, y + text_h + top))
 
-                for i in range(0, len(wrapped_translation)):
-                    # get size/position values
-                    text_size = self.braille_font.getbbox(str(wrapped_translation[i]))
-                    _, _, text_w, text_h = text_size
+        # TEXT CAPTIONS
+        text_start_y = translation_start_y - (default_braille_row_gap * len(wrapped_speech))
+        for i in range(0, len(wrapped_speech)):
+            coverage, (left, top, text_w, _) = self.alpha_atlas.compose(wrapped_speech[i])
+            x = round(width / 2) - round(text_w / 2)
+            y = text_start_y + (i * (default_text_height + round(default_text_height * 0.75)))
+            lines.append((coverage, x + left, y + default_text_height + top))
 
-                    # position
-                    x = round(width / 2) - round(text_w / 2)
-                    y = translation_start_y + (i * (text_h + round(text_h * 0.5)))
+        # overlay covers every caption box, clipped to the frame
+        margin = self.edges_margin
+        x0 = max(min(x for _, x, _ in lines) - margin, 0)
+        y0 = max(min(y for _, _, y in lines) - margin, 0)
+        x1 = min(max(x + coverage.shape[1] for coverage, x, _ in lines) + margin + 1, width)
+        y1 = min(max(y + coverage.shape[0] for coverage, _, y in lines) + margin + 1, height)
+        if x1 <= x0 or y1 <= y0:
+            return None
+        color = np.zeros((y1 - y0, x1 - x0, 3), dtype=np.float32)
+        transmit = np.ones((y1 - y0, x1 - x0, 1), dtype=np.float32)
 
-                    # create captions
-                    bbox = draw.textbbox((x, y + text_h), wrapped_translation[i], font=self.braille_font)
-                    draw.rounded_rectangle((bbox[0] - self.edges_margin, bbox[1] - self.edges_margin, bbox[2] + self.edges_margin, bbox[3] + self.edges_margin), fill=self.bg_color, radius = self.edges_curve_radius)
-                    draw.text((x, y + text_h), wrapped_translation[i], font=self.braille_font, fill=self.text_color)
+        bg_alpha = self.bg_color[3] / 255
+        for coverage, x, y in lines:
+            box_h, box_w = coverage.shape[0] + 2 * margin + 1, coverage.shape[1] + 2 * margin + 1
+            background = self.roundedRectMask(box_w, box_h, self.edges_curve_radius) * bg_alpha
+            self.overLayer(color, transmit, x - margin - x0, y - margin - y0, background, self.bg_color[:3])
+            self.overLayer(color, transmit, x - x0, y - y0, coverage / 255, self.text_color)
 
-                # TEXT CAPTIONS
+        metrics.record("caption_render", start)
+        # frames are BGR, the colours RGB
+        return (y0, y1, x0, x1,
+                np.ascontiguousarray(np.rint(color[:, :, ::-1]), dtype=np.uint16),
+                np.rint(transmit * 255).astype(np.uint16))
 
-                # start position for text captions
-                text_start_y = translation_start_y - (default_braille_row_gap * len(wrapped_speech))
+    def roundedRectMask(self, width, height, radius):
+        # filled rounded rectangle like ImageDraw.rounded_rectangle, as a float mask
+        radius = min(radius, width // 2, height // 2)
+        ys, xs = np.ogrid[:height, :width]
+        # distance into the corner squares, 0 outside them
+        dx = np.maximum(np.maximum(radius - xs, xs - (width - 1 - radius)), 0)
+        dy = np.maximum(np.maximum(radius - ys, ys - (height - 1 - radius)), 0)
+        return (dx * dx + dy * dy <= radius * radius).astype(np.float32)
 
-                for i in range(0, len(wrapped_speech)):
-                    # get size/position values
-                    text_size = self.alpha_font.getbbox(str(wrapped_speech[i]))
-                    _, _, text_w, _ = text_size
+    def overLayer(self, color, transmit, x, y, alpha, rgb):
+        # composite a layer of the given alpha and colour over the overlay at (x, y), clipped to it
+        height, width = alpha.shape
+        top, left = max(-y, 0), max(-x, 0)
+        bottom, right = min(height, color.shape[0] - y), min(width, color.shape[1] - x)
+        if bottom <= top or right <= left:
+            return
+        alpha = alpha[top:bottom, left:right, None]
+        region = (slice(y + top, y + bottom), slice(x + left, x + right))
+        color[region] = color[region] * (1 - alpha) + alpha * np.asarray(rgb, dtype=np.float32)
+        transmit[region] *= 1 - alpha
 
-                    # position
-                    x = round(width / 2) - round(text_w / 2)
-                    y = text_start_y + (i * (default_text_height + round(default_text_height * 0.75)))
+    def blendOverlay(self, img, overlay):
+        # img = color + img * transmit / 255, in place on the caption region
+        if overlay is None:
+            return img
+        y0, y1, x0, x1, color, transmit = overlay
+        region = img[y0:y1, x0:x1]
+        height, width = region.shape[:2]
+        scratch = getattr(self.blend_buffers, "scratch", None)
+        if scratch is None or scratch.shape[1] < height or scratch.shape[2] < width:
+            if scratch is not None:
+                height, width = max(height, scratch.shape[1]), max(width, scratch.shape[2])
+            scratch = np.empty((2, height, width, region.shape[2]), dtype=np.uint16)
+            self.blend_buffers.scratch = scratch
+        blended = scratch[0, :region.shape[0], :region.shape[1]]
+        shifted = scratch[1, :region.shape[0], :region.shape[1]]
+        np.multiply(region, transmit, out=blended)
+        # divide by 255 with rounding
+        blended += 128
+        np.right_shift(blended, 8, out=shifted)
+        blended += shifted
+        blended >>= 8
+        blended += color
+        region[...] = blended
+        return img
 
-                    # create captions
-                    bbox = draw.textbbox((x, y + default_text_height), wrapped_speech[i], font=self.alpha_font)
-                    draw.rounded_rectangle((bbox[0] - self.edges_margin, bbox[1] - self.edges_margin, bbox[2] + self.edges_margin, bbox[3] + self.edges_margin), fill=self.bg_color, radius = self.edges_curve_radius)
-                    draw.text((x, y + default_text_height), wrapped_speech[i], font=self.alpha_font, fill=self.text_color)
+    def drawHud(self, img, lines):
+        import cv2 # opencv-python in package manager
 
-            # convert from pillow to np
-            img = np.array(img_pil)
+        for i, line in enumerate(lines):
+            position = (10, 24 + i * 22)
+            cv2.putText(img, line, position, cv2.FONT_HERSHEY_SIMPLEX, 0.55, (0, 0, 0), 3, cv2.LINE_AA)
+            cv2.putText(img, line, position, cv2.FONT_HERSHEY_SIMPLEX, 0.55, (255, 255, 255), 1, cv2.LINE_AA)
+
+    def composeFrame(self, img, speech_text):
+        # mirror, captions and hud all drawn in place on the camera buffer, at its full resolution
+        import cv2 # opencv-python in package manager
+
+        height, width = img.shape[:2]
+        cv2.flip(img, 1, dst=img)
+        # caption lines take up to 60% of the frame, the speech thread lays them out again when it changes
+        self.caption_width = round(width * 0.6)
+
+        # captions are rendered once per text, then blended onto the caption region only
+        start = metrics.clock()
+        self.blendOverlay(img, self.captionOverlay(speech_text, width, height))
+        metrics.record("captions", start)
+
+        if self.hud:
+            # refreshed twice a second, the snapshot isn't free
+            if start - self.hud_updated > 0.5:
+                self.hud_lines, self.hud_updated = metrics.summary(self.hud_stages), start
+            self.drawHud(img, self.hud_lines)
+
+        if self.display_scale == 1:
+            return img
+        # downscaled into a buffer kept between frames
+        size = (round(width * self.display_scale), round(height * self.display_scale))
+        if self.display_buffer is None or self.display_buffer.shape[:2] != (size[1], size[0]):
+            self.display_buffer = np.empty((size[1], size[0], 3), dtype=np.uint8)
+        return cv2.resize(img, size, dst=self.display_buffer, interpolation=cv2.INTER_AREA)
+
+    def videoCaptioning(self, cam=None):
+        # imported here so it loads on the video thread instead of delaying startup
+        import cv2 # opencv-python in package manager
+
+        if cam is None:
+            # set the width and height, and UNSUCCESSFULLY set the exposure time
+            cam = cv2.VideoCapture(0)
+            cam.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc('M', 'J', 'P', 'G'))  # depends on fourcc available camera
+            cam.set(cv2.CAP_PROP_FRAME_WIDTH, cam.get(cv2.CAP_PROP_FRAME_WIDTH))
+            cam.set(cv2.CAP_PROP_FRAME_HEIGHT, cam.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            # cam.set(cv2.CAP_PROP_FRAME_WIDTH, 1920)
+            # cam.set(cv2.CAP_PROP_FRAME_HEIGHT, 1080)
+            cam.set(cv2.CAP_PROP_FPS, cam.get(cv2.CAP_PROP_FPS))
+
+        # read recording on its own thread, always showing the newest frame
+        grabber = FrameGrabber(cam).start()
+
+        print("Starting Transcriber...")
+
+        # for the speech to caption latency and fps
+        shown_text = None
+        frames, fps_start = 0, metrics.clock()
+
+        while True:
+            start = metrics.clock()
+            img = grabber.read()
+            metrics.record("camera_read", start)
+            if img is None:
+                if grabber.running:
+                    continue
+                # camera gone
+                break
+            self.running = True
+
+            speech_text, captured = self.speech_text, self.speech_captured
+            display = self.composeFrame(img, speech_text)
 
             # display captioned video
-            cv2.imshow(self.displayWindowName, img)
+            start = metrics.clock()
+            cv2.imshow(self.displayWindowName, display)
+
+            key = cv2.waitKey(1)
+            metrics.record("display", start)
+
+            if metrics.enabled:
+                # first frame showing new text
+                if speech_text != shown_text:
+                    if captured:
+                        metrics.record("speech_to_caption", captured)
+                    shown_text = speech_text
+                frames += 1
+                now = metrics.clock()
+                if now - fps_start >= 1:
+                    metrics.gauge("fps", frames / (now - fps_start))
+                    metrics.gauge("camera_dropped_frames", grabber.dropped)
+                    frames, fps_start = 0, now
 
-            key = cv2.waitKey(10)
             if key == 27:
-                self.running = False
-                self.terminated = True
-                self.stt.terminate()
                 break
             if cv2.getWindowProperty(self.displayWindowName, cv2.WND_PROP_VISIBLE) < 1:
-                self.running = False
-                self.terminated = True
-                self.stt.terminate()
                 break
 
+        self.running = False
+        self.terminated = True
+        grabber.stop()
+        cam.release()
         cv2.destroyAllWindows()
-        cv2.VideoCapture(0).release()
-        print("Shutting Down...")
\ No newline at end of file
+        print("Shutting Down...")
+        if self.stt is not None:
+            self.stt.terminate()
@@ -0,0 +1,68 @@
+import csv
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+
+# bump when the layout of the saved codex changes
+CODEX_VERSION = 1
+
+CSV_PATH = "./braille_characters.csv"
+CODEX_PATH = "./braille_codex.pickle"
+
+
+def csv_hash(csv_path=CSV_PATH):
+    with open(csv_path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def build_codex(csv_path=CSV_PATH):
+    # map of class -> {key: braille}, same as the old pandas groupby:
+    # classes in csv order, keys sorted, first value kept for repeated keys
+    grouped = {}
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            grouped.setdefault(row["class"], {}).setdefault(row["key"], row["value"])
+    return {label: {key: values[key] for key in sorted(values)} for label, values in grouped.items()}
+
+
+def save_codex(codex, digest, codex_path=CODEX_PATH):
+    # write to a temp file first so a half written codex is never loaded, one per process as
+    # e.g. BrailleDocument workers all rebuild the codex at once
+    fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(os.path.abspath(codex_path)))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump({"version": CODEX_VERSION, "csv_sha256": digest, "codex": codex}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, codex_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def load_codex(csv_path=CSV_PATH, codex_path=CODEX_PATH):
+    # load the precompiled codex, rebuilding it if it is missing or the csv has changed
+    digest = csv_hash(csv_path)
+    try:
+        with open(codex_path, "rb") as f:
+            saved = pickle.load(f)
+        if saved["version"] == CODEX_VERSION and saved["csv_sha256"] == digest:
+            return saved["codex"]
+    except (OSError, EOFError, KeyError, TypeError, pickle.UnpicklingError):
+        pass
+
+    codex = build_codex(csv_path)
+    try:
+        save_codex(codex, digest, codex_path)
+    except OSError as e:
+        # read-only install, keep going with the freshly built codex
+        print("Could not save braille codex: " + str(e), file=sys.stderr)
+    return codex
+
+
+if __name__ == "__main__":
+    # build step: python BrailleCodex.py [csv_path] [codex_path]
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else CSV_PATH
+    codex_path = sys.argv[2] if len(sys.argv) > 2 else CODEX_PATH
+    save_codex(build_codex(csv_path), csv_hash(csv_path), codex_path)
+    print("Saved braille codex to " + codex_path)
@@ -0,0 +1,117 @@
+import argparse
+import multiprocessing
+import sys
+import textwrap
+import time
+from collections import deque
+
+from SubtitleWriter import to_brf
+
+# one encoder per worker process, its word cache deduplicates the words the worker sees
+encoder = None
+
+
+def init_worker(cache_size):
+    global encoder
+    from BrailleEncoder import BrailleEncoder
+
+    encoder = BrailleEncoder(cache_size=cache_size)
+
+
+def encode_lines(lines):
+    """Encode a chunk of lines, returns the braille lines and the number of words."""
+    return [encoder.encode_text(line) for line in lines], sum(len(line.split()) for line in lines)
+
+
+def read_chunks(paths, chunk_lines):
+    """Stream text files ("-" for stdin) as lists of chunk_lines lines."""
+    chunk = []
+    for path in paths:
+        f = sys.stdin if path == "-" else open(path, encoding="utf-8", errors="replace")
+        try:
+            for line in f:
+                chunk.append(line.rstrip("\r\n"))
+                if len(chunk) == chunk_lines:
+                    yield chunk
+                    chunk = []
+        finally:
+            if f is not sys.stdin:
+                f.close()
+    if chunk:
+        yield chunk
+
+
+class BrailleDocument:
+    """Transcribes text documents to braille on a pool of processes, in order and in constant memory."""
+
+    def __init__(self, workers=None, width=40, page_lines=25, chunk_lines=2000, cache_size=100000):
+        self.workers = workers or multiprocessing.cpu_count()
+        # cells per line and lines per page of the output, page_lines=0 for no pages
+        self.width = width
+        self.page_lines = page_lines
+        self.chunk_lines = chunk_lines
+        # distinct words each worker keeps encoded
+        self.cache_size = cache_size
+        self.words = 0
+        self.page_line = 0
+
+    def layout(self, braille_lines):
+        # wrap every line at spaces, blank lines are kept; a new page starts with a form feed
+        for braille in braille_lines:
+            for line in textwrap.wrap(braille, self.width) or [""]:
+                if self.page_lines and self.page_line == self.page_lines:
+                    line = "\f" + line
+                    self.page_line = 0
+                self.page_line += 1
+                yield line
+
+    def finish(self, result):
+        braille_lines, words = result
+        self.words += words
+        return self.layout(braille_lines)
+
+    def transcribe(self, paths):
+        """Yield the output lines of every file in order, then report words/s."""
+        started = time.perf_counter()
+        with multiprocessing.Pool(self.workers, initializer=init_worker, initargs=(self.cache_size,)) as pool:
+            pending = deque()
+            for chunk in read_chunks(paths, self.chunk_lines):
+                pending.append(pool.apply_async(encode_lines, (chunk,)))
+                # only a couple of chunks per worker are read ahead, so memory stays constant
+                if len(pending) >= self.workers * 2:
+                    yield from self.finish(pending.popleft().get())
+            while pending:
+                yield from self.finish(pending.popleft().get())
+        self.report(time.perf_counter() - started)
+
+    def report(self, elapsed):
+        print("{} words in {:.1f} s with {} workers, {:.0f} words/s".format(
+            self.words, elapsed, self.workers, self.words / elapsed if elapsed else 0), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Transcribe text files to Grade 2 UEB braille, as unicode braille or BRF.")
+    parser.add_argument("files", nargs="+", metavar="FILENAME", help="text files, - for stdin")
+    parser.add_argument("-o", "--output", type=str, metavar="FILENAME", help="write braille here instead of stdout")
+    parser.add_argument("--brf", action="store_true", help="write ascii braille (BRF) instead of unicode braille")
+    parser.add_argument("-w", "--width", type=int, default=40, help="braille cells per line")
+    parser.add_argument("--page-lines", type=int, default=25, help="lines per page, 0 for no page breaks")
+    parser.add_argument("-j", "--workers", type=int, help="encoding processes (default: one per cpu)")
+    parser.add_argument("--chunk-lines", type=int, default=2000, help="lines sent to a worker at a time")
+    args = parser.parse_args()
+
+    document = BrailleDocument(args.workers, args.width, args.page_lines, args.chunk_lines)
+    if args.output:
+        # brf is plain ascii with crlf line ends, anything that isn't braille becomes ?
+        if args.brf:
+            output = open(args.output, "w", encoding="ascii", errors="replace", newline="\r\n")
+        else:
+            output = open(args.output, "w", encoding="utf-8")
+    else:
+        output = sys.stdout
+    try:
+        for line in document.transcribe(args.files):
+            output.write((to_brf(line) if args.brf else line) + "\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
@@ -1,18 +1,17 @@
-import pandas as pd
 import re
+from functools import lru_cache
 
+from BrailleCodex import load_codex
+from Metrics import metrics
+
+# words and punctuation marks of a sentence, each encoded on its own
+WORD_PATTERN = r"\w+|[^\w\s]"
 
-class BrailleEncoder:
-    def __init__(self):
-        df = pd.read_csv("./braille_characters.csv").drop(['formula'], axis=1)
 
-        # create map of word/braille chars from df
-        self.codex = {}
-        for label in df['class'].unique():
-            temp_df = df.loc[df['class'] == label].drop(['class'], axis=1)
-            temp_dict = {label: temp_df.groupby(['key']).apply(lambda x: x['value'].tolist()[0]).to_dict()}
-            self.codex.update(temp_dict)
-        self.codex.keys()
+class BrailleEncoder:
+    def __init__(self, engine="trie", cache_size=4096, incremental=False):
+        # map of word/braille chars, precompiled from braille_characters.csv
+        self.codex = load_codex()
 
         # prefixes and suffixes added to text: indicates capital, lower, number
         indicators = ['indicators']
@@ -46,6 +45,70 @@ class BrailleEncoder:
         self.alphanum_dict = self.select_keys(alphanum, self.codex)
         self.alphanum_dict = self.reorder_dict(alphanum, self.alphanum_dict)
 
+        # "trie" uses the compiled codex below, "legacy" scans the codex dicts for every word
+        if engine not in ("trie", "legacy"):
+            raise ValueError("unknown encoding engine: " + str(engine))
+        self.engine = engine
+        self.compile_codex()
+
+        # per-word LRU cache of encoded words, cache_size=None for unbounded, 0 to disable
+        self.encode_cached = lru_cache(maxsize=cache_size)(self.encode_indicated_word)
+
+        # previous sentence, reused by encode_text when incremental
+        self.incremental = incremental
+        self.clear_cache()
+
+    def compile_codex(self):
+        # whole words: single lookup, the highest priority class wins
+        self.word_signs_lookup = {}
+        for word_type in self.word_signs_dict.keys():
+            for word_key, word_value in self.word_signs_dict[word_type].items():
+                self.word_signs_lookup.setdefault(word_key, word_value)
+
+        # contractions: one Aho-Corasick automaton over the keys of every class, a state's output
+        # is the (class, codex rank, key) of each key ending there
+        self.contraction_types = list(self.contractions_dict.keys())
+        goto = [{}]
+        output = [set()]
+        for class_index, contraction_type in enumerate(self.contraction_types):
+            for rank, contraction_key in enumerate(self.contractions_dict[contraction_type].keys()):
+                state = 0
+                for char in contraction_key:
+                    if char not in goto[state]:
+                        goto[state][char] = len(goto)
+                        goto.append({})
+                        output.append(set())
+                    state = goto[state][char]
+                output[state].add((class_index, rank, contraction_key))
+
+        # breadth first, so a state's failure state is complete before it; every state gets a
+        # transition for each key char and any other char goes back to the root
+        alphabet = {char for transitions in goto for char in transitions}
+        fail = [0] * len(goto)
+        queue = []
+        for char in alphabet:
+            state = goto[0].setdefault(char, 0)
+            if state:
+                queue.append(state)
+        for state in queue:
+            output[state] |= output[fail[state]]
+            for char in alphabet:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    goto[state][char] = goto[fail[state]][char]
+                else:
+                    fail[next_state] = goto[fail[state]][char]
+                    queue.append(next_state)
+        self.contraction_goto = goto
+        self.contraction_output = [frozenset(entries) for entries in output]
+
+        # single characters: translation table, first class wins
+        alphanum_map = {}
+        for char_type in self.alphanum_dict.keys():
+            for char_key, char_value in self.alphanum_dict[char_type].items():
+                alphanum_map.setdefault(char_key, char_value)
+        self.alphanum_table = str.maketrans(alphanum_map)
+
     def reorder_dict(self, desired_keys, input_dict):
         # match order
         return {k: input_dict[k] for k in desired_keys}
@@ -72,7 +135,75 @@ class BrailleEncoder:
             return s[:find] + repl + s[find + len(sub):]
         return s
 
+    def find_contractions(self, chars):
+        # one pass over chars, every codex key found in it as (class, rank, key) in codex order
+        goto = self.contraction_goto
+        output = self.contraction_output
+        found = set()
+        state = 0
+        for char in chars:
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found |= output[state]
+        return sorted(found)
+
     def encode_word(self, word):
+        if self.engine == "legacy":
+            return self.encode_word_legacy(word)
+        return self.encode_word_trie(word)
+
+    def encode_word_trie(self, word):
+        # same rules as encode_word_legacy, using the structures built by compile_codex
+
+        # encode whole words
+        word_sign = self.word_signs_lookup.get(word)
+        if word_sign is not None:
+            return word_sign
+
+        # encode contractions
+        word_chars = word
+        # text that later contractions are matched against (used chars removed)
+        remaining = word
+        found = self.find_contractions(remaining)
+        i = 0
+        while i < len(found):
+            entry = found[i]
+            i += 1
+            class_index, rank, contraction_key = entry
+            contraction_type = self.contraction_types[class_index]
+            contraction_value = self.contractions_dict[contraction_type][contraction_key]
+
+            if contraction_type == 'initial_letter_contractions' and word.startswith(" " + contraction_key):
+                # if not start of word, skip this contraction
+                continue
+            elif contraction_type == 'final_letter_groupsigns':
+                if not word.endswith(contraction_key) or word.endswith(" " + contraction_key):
+                    continue
+                # replace last instance
+                word_chars = self.nth_repl(word_chars[::-1], contraction_key[::-1], contraction_value[::-1], 1)[::-1]
+                # remove used chars from string (matched reversed, as encode_word_legacy does)
+                remaining = self.nth_repl(word_chars[::-1], contraction_key[::-1], "", 1)
+            elif contraction_type == 'middle_word_groupsigns':
+                # if the contraction is the whole word, skip it
+                if contraction_key == word:
+                    continue
+                # if the word starts with this contraction, replace the second occurance of this contraction
+                index = 2 if word.startswith(contraction_key) else 1
+                word_chars = self.nth_repl(word_chars, contraction_key, contraction_value, index)
+                remaining = self.nth_repl(word_chars, contraction_key, "", index)
+            else:
+                # replace first instance
+                word_chars = self.nth_repl(word_chars, contraction_key, contraction_value, 1)
+                remaining = self.nth_repl(word_chars, contraction_key, "", 1)
+
+            # removing the used chars can join new keys, only the ones ranked after this key are left to try
+            found = [later for later in self.find_contractions(remaining) if later > entry]
+            i = 0
+
+        # encode individual chars
+        return word_chars.translate(self.alphanum_table)
+
+    def encode_word_legacy(self, word):
         # encode whole words
         for word_type in self.word_signs_dict.keys():
             for word_key in self.word_signs_dict[word_type].keys():
@@ -159,69 +290,101 @@ class BrailleEncoder:
 
         return word_chars
 
-    def encode_text(self, sentence):
-        words = re.findall(r"\w+|[^\w\s]", sentence, re.UNICODE)
-
-        encoded_words = []
-        new_sentence = []
-
+    def indicate_word(self, word, index, passage):
         # if sentence is upper case
-        if " ".join(words).isupper():
-            for i in range(len(words)):
-                encoded_words.append(self.encode_word(words[i].lower()))
-                if i == 0:
-                    new_sentence.append(self.indicators_dict['indicators']['capital_passage'] + words[i])
-                else:
-                    new_sentence.append(words[i])
-
-        else:
-
-            for i in range(len(words)):
-
-                encoded_words.append(self.encode_word(words[i].lower()))
-
-                # if word is numeric
-                if words[i].isnumeric():
-                    new_word = self.indicators_dict['indicators']['numeric'] + words[i]
-                    new_sentence.append(new_word)
-
-                # if word is upper case
-                elif words[i].isupper():
-                    new_word = self.indicators_dict['indicators']['capital_word'] + words[i]
-                    new_sentence.append(new_word)
-
-                else:
-
-                    temp_word = ""
-
-                    # add indicators letter by letter
-                    for j in range(len(words[i])):
-
-                        # if first letter of word is capitalised
-                        if j == 0 and words[i][j].isupper():
-                            temp_word += self.indicators_dict['indicators']['capital_letter'] + words[i][j]
-
-                        # # mid word capitals
-                        # elif words[i][j].isupper():
-                        #   temp_word += indicators_dict['indicators']['capital_letter']+ words[i][j]
-
-                        # individual numbers
-                        elif words[i][j].isnumeric():
-                            temp_word += self.indicators_dict['indicators']['numeric'] + words[i][j]
-
-                        # just copy the letter over as is
-                        else:
-                            temp_word += words[i][j]
-
-                    new_sentence.append(temp_word)
-
-        # mapped_words = dict(zip(words, encoded_words))
-        encoded_sentence = []
-        for i in range(len(new_sentence)):
-            encoded_sentence.append(self.nth_repl(new_sentence[i], words[i], encoded_words[i], 1))
+        if passage:
+            if index == 0:
+                return self.indicators_dict['indicators']['capital_passage'] + word
+            return word
+
+        # if word is numeric
+        if word.isnumeric():
+            return self.indicators_dict['indicators']['numeric'] + word
+
+        # if word is upper case
+        if word.isupper():
+            return self.indicators_dict['indicators']['capital_word'] + word
+
+        temp_word = ""
+
+        # add indicators letter by letter
+        for j in range(len(word)):
+
+            # if first letter of word is capitalised
+            if j == 0 and word[j].isupper():
+                temp_word += self.indicators_dict['indicators']['capital_letter'] + word[j]
+
+            # # mid word capitals
+            # elif word[j].isupper():
+            #   temp_word += indicators_dict['indicators']['capital_letter']+ word[j]
+
+            # individual numbers
+            elif word[j].isnumeric():
+                temp_word += self.indicators_dict['indicators']['numeric'] + word[j]
+
+            # just copy the letter over as is
+            else:
+                temp_word += word[j]
+
+        return temp_word
+
+    def encode_indicated_word(self, word, indicators):
+        # cached by encode_cached on the lowercased word and its indicators
+        return indicators + self.encode_word(word)
+
+    def encode_sentence_word(self, word, index, passage):
+        new_word = self.indicate_word(word, index, passage)
+        if new_word.endswith(word):
+            return self.encode_cached(word.lower(), new_word[:len(new_word) - len(word)])
+        # numbers inside a word break it up, leave it as the legacy replacement does
+        return self.nth_repl(new_word, word, self.encode_word(word.lower()), 1)
+
+    def cache_info(self):
+        info = self.encode_cached.cache_info()
+        return {
+            'hits': info.hits,
+            'misses': info.misses,
+            'size': info.currsize,
+            'max_size': info.maxsize,
+            'incremental_reused_words': self.reused_words,
+            'incremental_encoded_words': self.encoded_words,
+        }
+
+    def clear_cache(self):
+        self.encode_cached.cache_clear()
+        self.reused_words = 0
+        self.encoded_words = 0
+        self.previous_words = []
+        self.previous_encoded = []
+        self.previous_passage = None
+
+    def encode_sentence(self, words):
+        # braille of every word of a sentence split by WORD_PATTERN, with the sentence's capital passage and word indexes
 
+        # if sentence is upper case
+        passage = " ".join(words).isupper()
+
+        # incremental: keep the encoded words shared with the previous sentence, only encode the changed tail
+        start = 0
+        if self.incremental and passage == self.previous_passage:
+            limit = min(len(words), len(self.previous_words))
+            while start < limit and words[start] == self.previous_words[start]:
+                start += 1
+        encoded_sentence = self.previous_encoded[:start]
+
+        for i in range(start, len(words)):
+            encoded_sentence.append(self.encode_sentence_word(words[i], i, passage))
+
+        self.reused_words += start
+        self.encoded_words += len(words) - start
+        if self.incremental:
+            self.previous_words = words
+            self.previous_encoded = encoded_sentence
+            self.previous_passage = passage
+        return encoded_sentence
 
-        encoded_sentence = " ".join(encoded_sentence)
+    def join_words(self, encoded_words):
+        encoded_sentence = " ".join(encoded_words)
 
         # remove spaces before period
         period = self.alphanum_dict['punctuation']["."]
@@ -237,6 +400,25 @@ class BrailleEncoder:
 
         return encoded_sentence
 
+    def encode_text(self, sentence):
+        start_time = metrics.clock()
+        encoded_sentence = self.join_words(self.encode_sentence(re.findall(WORD_PATTERN, sentence, re.UNICODE)))
+        metrics.record("encode_text", start_time)
+        return encoded_sentence
+
+    def encode_words(self, sentence):
+        # braille of every space separated word of sentence, encoded in the context of the whole sentence like encode_text
+        start_time = metrics.clock()
+        encoded_words = self.encode_sentence(re.findall(WORD_PATTERN, sentence, re.UNICODE))
+        encoded_tokens = []
+        i = 0
+        for token in sentence.split():
+            count = len(re.findall(WORD_PATTERN, token, re.UNICODE))
+            encoded_tokens.append(self.join_words(encoded_words[i:i + count]))
+            i += count
+        metrics.record("encode_text", start_time)
+        return encoded_tokens
+
 # be = BrailleEncoder()
 # print(be.encode_text("English to Braille Transcriber"))
 # print(be.encode_text("ALL CAPS SENTENCE"))
@@ -0,0 +1,158 @@
+def align_words(tokens, words):
+    """Match caption tokens to the recognizer's word timings.
+
+    words are vosk result entries ({"word", "start", "end", "conf"}) of the raw text; a token
+    that number conversion made out of several words ("twenty one" -> "21") gets all of them.
+    Returns a (start, end, conf) tuple or None for every token.
+    """
+    if not words:
+        return [None] * len(tokens)
+    timings = []
+    j = 0
+    for i, token in enumerate(tokens):
+        if j >= len(words):
+            timings.append(None)
+            continue
+        if words[j]["word"] == token:
+            group = [words[j]]
+            j += 1
+        else:
+            # converted: take words up to the one the next token starts with
+            following = tokens[i + 1] if i + 1 < len(tokens) else None
+            group = [words[j]]
+            j += 1
+            while j < len(words) and words[j]["word"] != following:
+                group.append(words[j])
+                j += 1
+        timings.append((group[0].get("start"), group[-1].get("end"), min(word.get("conf", 1.0) for word in group)))
+    return timings
+
+
+class CaptionWord:
+    """A word on screen, with its braille and pixel widths worked out once."""
+
+    def __init__(self, text, braille, text_width, braille_width, timing=None):
+        self.text = text
+        self.braille = braille
+        self.text_width = text_width
+        self.braille_width = braille_width
+        self.start, self.end, self.conf = timing or (None, None, None)
+        # partial results it has survived unchanged, stable once it is final or old enough
+        self.age = 0
+        self.stable = False
+
+
+class CaptionModel:
+    """Words of the captions, laid out in lines that fit max_width pixels of text and of braille.
+
+    update() only lays out again from the line holding the first changed word, and lines of
+    finished sentences scroll out once more than max_lines are on screen, so the work per
+    update doesn't grow with the length of the sentence.
+    encoder gives the braille of every word in the context of its sentence (encode_words of a
+    BrailleEncoder or ProcessPipeline); measure_text and measure_braille return the pixel width of a string.
+    """
+
+    def __init__(self, encoder, measure_text, measure_braille, max_width=640, max_lines=2, stable_after=2):
+        self.encoder = encoder
+        self.measure_text = measure_text
+        self.measure_braille = measure_braille
+        self.max_width = max_width
+        self.max_lines = max_lines
+        # partial results a word has to survive to be stable
+        self.stable_after = stable_after
+        self.space_width = (measure_text(" "), measure_braille(" "))
+
+        # words from the first line still kept, words[:committed] are from finished sentences
+        self.words = []
+        self.committed = 0
+        # index of the first word of every line
+        self.lines = []
+        # words laid out again, over every update
+        self.laid_out = 0
+
+    def make_word(self, text, braille, timing):
+        return CaptionWord(text, braille, self.measure_text(text), self.measure_braille(braille), timing)
+
+    def update(self, text, final=False, words=None):
+        """Replace the unfinished sentence with text, returns the index of the first changed word."""
+        tokens = text.split()
+        # a word's braille depends on the rest of the sentence, e.g. a capital passage
+        braille = self.encoder.encode_words(text)
+        timings = align_words(tokens, words)
+        current = self.words[self.committed:]
+
+        same = 0
+        while (same < min(len(tokens), len(current)) and tokens[same] == current[same].text
+               and braille[same] == current[same].braille):
+            word = current[same]
+            word.age += 1
+            if timings[same]:
+                word.start, word.end, word.conf = timings[same]
+            word.stable = final or word.age >= self.stable_after
+            same += 1
+
+        changed = self.committed + same
+        self.words[changed:] = [self.make_word(token, cells, timing)
+                                for token, cells, timing in zip(tokens[same:], braille[same:], timings[same:])]
+        if final:
+            for word in self.words[self.committed:]:
+                word.stable = True
+            self.committed = len(self.words)
+
+        self.layout(changed)
+        self.scroll()
+        return changed
+
+    def set_width(self, max_width):
+        # e.g. a different frame size, everything is laid out again
+        self.max_width = max_width
+        self.lines = []
+        self.layout(0)
+        self.scroll()
+
+    def layout(self, changed):
+        # lines before the one holding the word ahead of the first changed word are left as they are,
+        # that line ends depending on whether the changed word fits on it
+        while self.lines and self.lines[-1] >= changed:
+            self.lines.pop()
+        start = self.lines.pop() if self.lines else 0
+
+        text_width = braille_width = 0
+        line_start = start
+        for i in range(start, len(self.words)):
+            word = self.words[i]
+            if i == line_start:
+                text_width, braille_width = word.text_width, word.braille_width
+                continue
+            text_width += self.space_width[0] + word.text_width
+            braille_width += self.space_width[1] + word.braille_width
+            if text_width > self.max_width or braille_width > self.max_width:
+                self.lines.append(line_start)
+                line_start = i
+                text_width, braille_width = word.text_width, word.braille_width
+        if line_start < len(self.words):
+            self.lines.append(line_start)
+        self.laid_out += len(self.words) - start
+
+    def scroll(self):
+        # forget lines above the visible ones once their sentences are finished
+        if len(self.lines) <= self.max_lines:
+            return
+        first = self.lines[-self.max_lines]
+        if first > self.committed:
+            first = max([line for line in self.lines if line <= self.committed])
+        if first == 0:
+            return
+        del self.words[:first]
+        self.committed -= first
+        self.lines = [line - first for line in self.lines if line >= first]
+
+    def visible(self):
+        """The last max_lines lines as a tuple of (text, braille) pairs."""
+        lines = []
+        starts = self.lines[-self.max_lines:]
+        for i, start in enumerate(starts):
+            end = starts[i + 1] if i + 1 < len(starts) else len(self.words)
+            words = self.words[start:end]
+            lines.append((" ".join(word.text for word in words), " ".join(word.braille for word in words)))
+        return tuple(lines)
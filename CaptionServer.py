@@ -0,0 +1,409 @@
+"""Captions many audio streams at once, with one Vosk model and one BrailleEncoder.
+
+Serve local microphones and/or streams sent over TCP:
+    python CaptionServer.py serve [--port 8765] [-j workers] [--device 1 --device 2]
+Send wav files as streams, printing their captions:
+    python CaptionServer.py send lecture.wav [more.wav ...] [--copies N] [--realtime]
+
+A stream is a line of JSON ({"session": name, "sample_rate": 16000}) followed by 16-bit
+mono PCM. The server answers with a line of JSON per caption update:
+{"text": ..., "braille": ..., "final": true|false}.
+Every session has its own KaldiRecognizer, and a pool of worker threads takes turns on the
+sessions with audio waiting. Per-session latency and the number of real-time streams one
+core can keep up with are printed every --report-interval seconds and on exit.
+"""
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import sys
+import threading
+import time
+import wave
+from collections import deque
+
+from AudioRingBuffer import AudioRingBuffer
+from BrailleEncoder import BrailleEncoder
+from Metrics import Metrics
+from ResultProcessor import ResultProcessor
+from TranscriptChannel import TranscriptChannel
+from VoiceActivity import VoiceActivityGate, GATE_MODES
+
+
+class Session:
+    """One audio stream: its recognizer, waiting audio, transcript and latency."""
+
+    def __init__(self, name, recognizer, sample_rate, block_frames, policy="drop_oldest", vad="off"):
+        self.name = name
+        self.recognizer = recognizer
+        self.sample_rate = sample_rate
+        self.audio = AudioRingBuffer(32, block_frames, policy=policy)
+        self.gate = VoiceActivityGate(sample_rate, vad)
+        self.results = ResultProcessor()
+        self.channel = TranscriptChannel()
+        # speech to caption latency of this session only
+        self.metrics = Metrics(enabled=True)
+
+        # set and read under the manager lock: a worker has the session, no more audio is coming,
+        # the last sentence was finalized
+        self.scheduled = False
+        self.closing = False
+        self.finished = False
+
+        self.audio_seconds = 0.0
+        self.cpu_seconds = 0.0
+        # report() as it was when the session was released
+        self.final_report = None
+
+    def publish(self, text, final, captured):
+        self.channel.publish(text, final, captured)
+        self.metrics.record("latency", captured)
+
+    def process(self, captured, samples):
+        rec = self.recognizer
+        self.audio_seconds += len(samples) / self.sample_rate
+        for action, data in self.gate.process(samples):
+            if action == "finalize":
+                text = self.results.final(rec.FinalResult())
+                if text:
+                    self.publish(text, True, captured)
+            elif rec.AcceptWaveform(data):
+                self.publish(self.results.final(rec.Result()), True, captured)
+            else:
+                text = self.results.partial(rec.PartialResult())
+                if text is not None:
+                    self.publish(text, False, captured)
+
+    def finish(self):
+        text = self.results.final(self.recognizer.FinalResult())
+        if text:
+            self.channel.publish(text, True)
+        self.channel.close()
+
+    def release(self):
+        # keep the report, let go of the recognizer, audio buffer and latency window
+        self.final_report = self.report()
+        self.recognizer = self.audio = self.gate = self.results = self.metrics = None
+
+    def report(self):
+        if self.final_report is not None:
+            return self.final_report
+        latency = self.metrics.snapshot()["stages"].get("latency")
+        return {
+            "audio_s": round(self.audio_seconds, 1),
+            "cpu_s": round(self.cpu_seconds, 2),
+            "real_time_factor": round(self.cpu_seconds / self.audio_seconds, 3) if self.audio_seconds else None,
+            "latency_p50_ms": round(latency["quantiles"]["0.5"] * 1000, 1) if latency else None,
+            "latency_p99_ms": round(latency["quantiles"]["0.99"] * 1000, 1) if latency else None,
+            "dropped_blocks": self.audio.dropped,
+        }
+
+
+class SessionManager:
+    """Loads the model once and recognizes every open session on a shared pool of worker threads."""
+
+    def __init__(self, model_path="small_model", workers=None, encoder=None, block_frames=4000, vad="off", turn_blocks=8,
+                 history=100):
+        # vosk is slow to import, only pay for it once the model is needed
+        from vosk import Model
+
+        print("\nLoading Model... ", file=sys.stderr)
+        self.model = Model(model_path)
+        # not incremental: the encoder is shared, only its word cache is reused between sessions
+        self.encoder = encoder or BrailleEncoder()
+        self.block_frames = block_frames
+        self.vad = vad
+        # blocks a worker recognizes before giving other sessions a turn
+        self.turn_blocks = turn_blocks
+
+        # open sessions, and the reports of the last history sessions that finished
+        self.sessions = {}
+        self.finished = deque(maxlen=history)
+        self.finished_count = 0
+        self.finished_audio = 0.0
+        self.lock = threading.Lock()
+        self.ready = queue.Queue()
+        self.workers = [threading.Thread(target=self.work, daemon=True) for _ in range(workers or os.cpu_count())]
+        for worker in self.workers:
+            worker.start()
+        self.cpu_start = time.process_time()
+        self.wall_start = time.perf_counter()
+
+    def open(self, name, sample_rate=16000, policy="drop_oldest"):
+        from vosk import KaldiRecognizer
+
+        session = Session(name, KaldiRecognizer(self.model, sample_rate), sample_rate,
+                          self.block_frames, policy, self.vad)
+        with self.lock:
+            if name in self.sessions and not self.sessions[name].finished:
+                raise ValueError("session already open: " + name)
+            self.sessions[name] = session
+        return session
+
+    def feed(self, session, data):
+        session.audio.put(data, time.perf_counter())
+        self.schedule(session)
+
+    def close(self, session):
+        # the audio already sent is still recognized, then the last sentence is finalized
+        with self.lock:
+            session.closing = True
+        session.audio.close()
+        self.schedule(session)
+
+    def schedule(self, session):
+        # a session is only ever with one worker, its recognizer isn't thread safe
+        with self.lock:
+            if session.scheduled or session.finished:
+                return
+            session.scheduled = True
+        self.ready.put(session)
+
+    def work(self):
+        while True:
+            session = self.ready.get()
+            if session is None:
+                return
+            start = time.thread_time()
+            for _ in range(self.turn_blocks):
+                block = session.audio.get(timeout=0)
+                if block is None:
+                    break
+                session.process(*block)
+
+            with self.lock:
+                requeue = session.audio.qsize() > 0
+                finish = not requeue and session.closing and not session.finished
+                session.finished = session.finished or finish
+                session.scheduled = requeue or finish
+            if finish:
+                session.finish()
+            session.cpu_seconds += time.thread_time() - start
+            if finish:
+                with self.lock:
+                    session.scheduled = False
+                    self.retire(session)
+            if requeue:
+                self.ready.put(session)
+
+    def retire(self, session):
+        # called with the lock held, once the session's last sentence is out
+        session.release()
+        if self.sessions.get(session.name) is session:
+            del self.sessions[session.name]
+        report = dict(session.final_report, session=session.name)
+        self.finished.append(report)
+        self.finished_count += 1
+        self.finished_audio += session.audio_seconds
+
+    def stop(self):
+        for _ in self.workers:
+            self.ready.put(None)
+
+    def report(self):
+        cpu = time.process_time() - self.cpu_start
+        with self.lock:
+            sessions = {name: session.report() for name, session in self.sessions.items()}
+            finished = list(self.finished)
+            finished_count = self.finished_count
+            audio = self.finished_audio + sum(session.audio_seconds for session in self.sessions.values())
+        return {
+            "sessions": sessions,
+            "finished_sessions": finished_count,
+            "recently_finished": finished,
+            "wall_s": round(time.perf_counter() - self.wall_start, 1),
+            "cpu_s": round(cpu, 2),
+            "audio_s": round(audio, 1),
+            # a real-time stream brings one second of audio per second
+            "streams_per_core": round(audio / cpu, 1) if cpu else None,
+            "encoder_cache": self.encoder.cache_info(),
+        }
+
+
+class StreamHandler(socketserver.StreamRequestHandler):
+    """One TCP stream: a JSON header line, then PCM until the client shuts down its side."""
+
+    def handle(self):
+        manager = self.server.manager
+        header = json.loads(self.rfile.readline() or "{}")
+        name = header.get("session") or "{}:{}".format(*self.client_address)
+        try:
+            # the client waits when recognition falls behind, instead of losing audio
+            session = manager.open(name, int(header.get("sample_rate", 16000)), policy="block")
+        except ValueError as e:
+            self.wfile.write((json.dumps({"error": str(e)}) + "\n").encode())
+            return
+
+        sender = threading.Thread(target=self.send_updates, args=(manager, session))
+        sender.start()
+        block_bytes = manager.block_frames * 2
+        try:
+            while True:
+                data = self.rfile.read(block_bytes)
+                if len(data) < 2:
+                    break
+                manager.feed(session, data[:len(data) // 2 * 2])
+        except OSError:
+            # e.g. the client reset the connection, the audio it sent is still captioned
+            pass
+        finally:
+            # every connection ends by closing its session, so it is finalized and released
+            manager.close(session)
+            sender.join()
+        # the worker may still be releasing the session, which it does under the lock
+        with manager.lock:
+            report = session.report()
+        print(name, json.dumps(report), file=sys.stderr)
+
+    def send_updates(self, manager, session):
+        version = 0
+        while True:
+            updates = session.channel.wait(version)
+            if updates is None:
+                return
+            version = updates[-1].version
+            for i, update in enumerate(updates):
+                # partials that were overtaken while sending are skipped, finals are always sent
+                if update.final or i == len(updates) - 1:
+                    line = {"text": update.text, "braille": manager.encoder.encode_text(update.text), "final": update.final}
+                    try:
+                        self.wfile.write((json.dumps(line, ensure_ascii=False) + "\n").encode("utf-8"))
+                    except (BrokenPipeError, ConnectionResetError):
+                        # the client is gone, its audio already sent is still recognized
+                        return
+
+
+class CaptionServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, manager):
+        self.manager = manager
+        super().__init__(address, StreamHandler)
+
+
+def listen_device(manager, device, stop):
+    # a local microphone as a session, its finished sentences printed as they come
+    import sounddevice as sd
+
+    sample_rate = int(sd.query_devices(device, "input")["default_samplerate"])
+    session = manager.open("device-" + str(device), sample_rate)
+
+    def callback(indata, frames, time_info, status):
+        if status:
+            print(status, file=sys.stderr)
+        manager.feed(session, indata)
+
+    def show():
+        for update in session.channel.subscribe():
+            if update.final and update.text:
+                print("[{}] {}  {}".format(session.name, update.text, manager.encoder.encode_text(update.text)))
+
+    threading.Thread(target=show, daemon=True).start()
+    with sd.RawInputStream(samplerate=sample_rate, blocksize=manager.block_frames, device=device,
+                           dtype="int16", channels=1, callback=callback):
+        stop.wait()
+    manager.close(session)
+
+
+def serve(args):
+    manager = SessionManager(args.model, args.workers, block_frames=args.block_frames, vad=args.vad)
+    stop = threading.Event()
+    for device in args.device or []:
+        device = int(device) if device.isdigit() else device
+        threading.Thread(target=listen_device, args=(manager, device, stop), daemon=True).start()
+
+    server = CaptionServer((args.host, args.port), manager)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print("Listening on {}:{} with {} workers... ".format(args.host, args.port, len(manager.workers)), file=sys.stderr)
+    try:
+        while not stop.wait(args.report_interval):
+            print(json.dumps(manager.report()), file=sys.stderr)
+    except KeyboardInterrupt:
+        pass
+    stop.set()
+    server.shutdown()
+    manager.stop()
+    print(json.dumps(manager.report(), indent=2), file=sys.stderr)
+
+
+def send_wav(host, port, path, name, realtime, block_frames=4000):
+    with wave.open(path, "rb") as wav:
+        if wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+            raise SystemExit(path + ": expected 16-bit mono wav")
+        sample_rate = wav.getframerate()
+
+        with socket.create_connection((host, port)) as connection:
+            header = {"session": name, "sample_rate": sample_rate}
+            connection.sendall((json.dumps(header) + "\n").encode())
+
+            def receive():
+                for line in connection.makefile("r", encoding="utf-8"):
+                    update = json.loads(line)
+                    if update.get("final") and update["text"] or "error" in update:
+                        print("[{}] {}".format(name, update.get("error") or update["text"] + "  " + update["braille"]))
+
+            receiver = threading.Thread(target=receive)
+            receiver.start()
+            start = time.perf_counter()
+            sent = 0
+            while True:
+                data = wav.readframes(block_frames)
+                if not data:
+                    break
+                connection.sendall(data)
+                sent += len(data) // 2
+                if realtime:
+                    delay = sent / sample_rate - (time.perf_counter() - start)
+                    if delay > 0:
+                        time.sleep(delay)
+            connection.shutdown(socket.SHUT_WR)
+            receiver.join()
+
+
+def send(args):
+    threads = []
+    for path in args.files:
+        for copy in range(args.copies):
+            name = "{}#{}".format(os.path.basename(path), copy)
+            threads.append(threading.Thread(target=send_wav, args=(args.host, args.port, path, name, args.realtime)))
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print("{} streams in {:.1f} s".format(len(threads), time.perf_counter() - start), file=sys.stderr)
+
+
+def main():
+    address = argparse.ArgumentParser(add_help=False)
+    address.add_argument("--host", type=str, default="127.0.0.1", help="address to listen on / connect to")
+    address.add_argument("-p", "--port", type=int, default=8765, help="port to listen on / connect to")
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", parents=[address], help="run the caption server")
+    serve_parser.add_argument("-j", "--workers", type=int, default=os.cpu_count(), help="recognition threads")
+    serve_parser.add_argument("-m", "--model", type=str, default="small_model", help="vosk model directory")
+    serve_parser.add_argument("-d", "--device", action="append", help="also caption this input device (numeric ID or substring)")
+    serve_parser.add_argument("--block-frames", type=int, default=4000, help="audio frames recognized at a time")
+    serve_parser.add_argument("--vad", choices=GATE_MODES, default="off", help="voice activity gating of every session")
+    serve_parser.add_argument("--report-interval", type=float, default=10, help="seconds between reports")
+
+    send_parser = commands.add_parser("send", parents=[address], help="stream wav files to a running server")
+    send_parser.add_argument("files", nargs="+", help="16-bit mono wav files")
+    send_parser.add_argument("-n", "--copies", type=int, default=1, help="streams per file, for load testing")
+    send_parser.add_argument("--realtime", action="store_true", help="send audio at the speed it would be spoken")
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        serve(args)
+    else:
+        send(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import threading
+import time
+
+import numpy as np
+
+
+class SyntheticCamera:
+    """Stands in for cv2.VideoCapture: a moving test pattern of any size, for testing without a camera.
+
+    fps=None delivers frames as fast as they are read.
+    """
+
+    def __init__(self, width=1280, height=720, fps=30):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        # twice as wide as a frame, every frame is a window shifted along it
+        self.pattern = np.random.default_rng(0).integers(0, 256, (height, width * 2, 3), dtype=np.uint8)
+        self.frames = 0
+        self.started = None
+
+    def isOpened(self):
+        return True
+
+    def read(self, image=None):
+        if self.fps:
+            if self.started is None:
+                self.started = time.perf_counter()
+            delay = self.frames / self.fps - (time.perf_counter() - self.started)
+            if delay > 0:
+                time.sleep(delay)
+        offset = (self.frames * 8) % self.width
+        window = self.pattern[:, offset:offset + self.width]
+        self.frames += 1
+        # like VideoCapture.read, the frame is decoded into image when it has the right shape
+        if image is None or image.shape != window.shape:
+            return True, window.copy()
+        np.copyto(image, window)
+        return True, image
+
+    def release(self):
+        pass
+
+
+class FrameGrabber:
+    """Reads frames on its own thread into preallocated buffers; read() hands out the newest one.
+
+    Frames the compositor wasn't ready for are dropped, so it never waits behind a camera queue.
+    """
+
+    def __init__(self, cam, buffers=3):
+        ok, frame = cam.read()
+        if not ok:
+            raise RuntimeError("could not read a frame from the camera")
+        self.cam = cam
+        # one for the newest frame, one with the reader, the rest for the camera to read into
+        self.buffers = [frame] + [np.empty_like(frame) for _ in range(buffers - 1)]
+        self.latest = 0
+        self.fresh = True
+        self.held = None
+        self.condition = threading.Condition()
+        self.running = True
+        self.captured = 1
+        self.dropped = 0
+        self.thread = threading.Thread(target=self.capture, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def capture(self):
+        while self.running:
+            with self.condition:
+                slot = next(i for i in range(len(self.buffers)) if i != self.latest and i != self.held)
+            ok, frame = self.cam.read(self.buffers[slot])
+            if not ok:
+                break
+            # some backends hand back a new array, e.g. when the frame size changes
+            self.buffers[slot] = frame
+            with self.condition:
+                if self.fresh:
+                    self.dropped += 1
+                self.latest, self.fresh = slot, True
+                self.captured += 1
+                self.condition.notify_all()
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+    def read(self, timeout=1):
+        # the newest frame not read yet, valid until the next read(); None on timeout or once stopped
+        with self.condition:
+            self.held = None
+            self.condition.wait_for(lambda: self.fresh or not self.running, timeout)
+            if not self.fresh:
+                return None
+            self.fresh = False
+            self.held = self.latest
+            return self.buffers[self.held]
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self.thread.join(1)
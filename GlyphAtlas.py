@@ -0,0 +1,80 @@
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont # Pillow in package manager
+
+# the 64 six dot braille cells (indicators included) and a space
+BRAILLE_CELLS = [chr(0x2800 + i) for i in range(64)] + [" "]
+
+# printable ascii, for the alphabetic captions
+ASCII_CHARS = [chr(i) for i in range(32, 127)]
+
+
+class GlyphAtlas:
+    """Glyphs of one font size rasterized once into a NumPy array, lines are composed by slicing it."""
+
+    def __init__(self, font_path, font_size, chars=BRAILLE_CELLS):
+        self.font = ImageFont.truetype(font_path, font_size)
+
+        # char -> (coverage, left, top, advance), coverage is a view into the atlas
+        self.glyphs = {}
+        rendered = [(char,) + self.rasterize(char) for char in chars]
+
+        # pack every glyph side by side into one array
+        atlas_height = max([coverage.shape[0] for _, coverage, _, _, _ in rendered] + [1])
+        atlas_width = sum(coverage.shape[1] for _, coverage, _, _, _ in rendered)
+        self.atlas = np.zeros((atlas_height, max(atlas_width, 1)), dtype=np.uint8)
+        x = 0
+        for char, coverage, left, top, advance in rendered:
+            height, width = coverage.shape
+            self.atlas[:height, x:x + width] = coverage
+            self.glyphs[char] = (self.atlas[:height, x:x + width], left, top, advance)
+            x += width
+
+    def rasterize(self, char):
+        # coverage of the glyph's ink box, its offset from the pen position and the pen advance
+        advance = self.font.getlength(char)
+        left, top, right, bottom = self.font.getbbox(char)
+        if right <= left or bottom <= top:
+            return np.zeros((0, 0), dtype=np.uint8), 0, 0, advance
+        img = Image.new("L", (right - left, bottom - top), 0)
+        ImageDraw.Draw(img).text((-left, -top), char, font=self.font, fill=255)
+        return np.asarray(img), left, top, advance
+
+    def glyph(self, char):
+        if char not in self.glyphs:
+            self.glyphs[char] = self.rasterize(char)
+        return self.glyphs[char]
+
+    def layout(self, text):
+        # pen position of every glyph, and the ink box of the whole line
+        placed = []
+        pen = 0.0
+        left = top = None
+        right = bottom = 0
+        for char in text:
+            coverage, glyph_left, glyph_top, advance = self.glyph(char)
+            x = round(pen) + glyph_left
+            height, width = coverage.shape
+            if width:
+                placed.append((coverage, x, glyph_top))
+                left = x if left is None else min(left, x)
+                top = glyph_top if top is None else min(top, glyph_top)
+                right = max(right, x + width)
+                bottom = max(bottom, glyph_top + height)
+            pen += advance
+        if left is None:
+            return placed, (0, 0, 0, 0)
+        return placed, (left, top, right, bottom)
+
+    def measure(self, text):
+        # same box as font.getbbox(text), without touching the font
+        return self.layout(text)[1]
+
+    def compose(self, text):
+        # coverage of the whole line, cropped to its ink box
+        placed, (left, top, right, bottom) = self.layout(text)
+        line = np.zeros((bottom - top, right - left), dtype=np.uint8)
+        for coverage, x, y in placed:
+            height, width = coverage.shape
+            target = line[y - top:y - top + height, x - left:x - left + width]
+            np.maximum(target, coverage, out=target)
+        return line, (left, top, right, bottom)
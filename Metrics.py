@@ -0,0 +1,143 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# upper bounds of the histogram buckets, in seconds
+BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5]
+
+QUANTILES = [0.5, 0.9, 0.99]
+
+
+class Metrics:
+    """Per-stage timers, gauges and rolling latency histograms for the caption pipeline.
+
+    Disabled by default: clock() returns 0 and record() returns straight away.
+    """
+
+    def __init__(self, enabled=False, window=1000):
+        self.enabled = enabled
+        # samples kept per stage for the rolling histograms
+        self.window = window
+        self.samples = {}
+        self.totals = {}
+        self.gauges = {}
+        self.lock = threading.Lock()
+        self.dump_thread = None
+        self.dumping = threading.Event()
+
+    def enable(self, window=None):
+        if window:
+            self.window = window
+        self.enabled = True
+
+    def clock(self):
+        # start of a stage, pass it to record() once the stage is done
+        if not self.enabled:
+            return 0
+        return time.perf_counter()
+
+    def record(self, stage, start):
+        if not self.enabled:
+            return
+        self.observe(stage, time.perf_counter() - start)
+
+    def observe(self, stage, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            if stage not in self.samples:
+                self.samples[stage] = deque(maxlen=self.window)
+                self.totals[stage] = [0, 0.0]
+            self.samples[stage].append(seconds)
+            total = self.totals[stage]
+            total[0] += 1
+            total[1] += seconds
+
+    def gauge(self, name, value):
+        if not self.enabled:
+            return
+        self.gauges[name] = value
+
+    def snapshot(self):
+        # rolling quantiles and bucket counts of every stage, plus the gauges
+        with self.lock:
+            samples = {stage: sorted(values) for stage, values in self.samples.items()}
+            totals = {stage: list(total) for stage, total in self.totals.items()}
+            gauges = dict(self.gauges)
+
+        stages = {}
+        for stage, values in samples.items():
+            if not values:
+                continue
+            buckets, i = {}, 0
+            for bound in BUCKETS:
+                while i < len(values) and values[i] <= bound:
+                    i += 1
+                buckets[str(bound)] = i
+            stages[stage] = {
+                "count": totals[stage][0],
+                "sum": totals[stage][1],
+                "window": len(values),
+                "max": values[-1],
+                "quantiles": {str(q): values[min(int(len(values) * q), len(values) - 1)] for q in QUANTILES},
+                "buckets": buckets,
+            }
+        return {"time": time.time(), "stages": stages, "gauges": gauges}
+
+    def prometheus(self):
+        # prometheus text format: stages as summaries over the rolling window, gauges as gauges
+        snapshot = self.snapshot()
+        lines = ["# TYPE braille_captions_stage_seconds summary"]
+        for stage, values in sorted(snapshot["stages"].items()):
+            for q, value in values["quantiles"].items():
+                lines.append('braille_captions_stage_seconds{{stage="{}",quantile="{}"}} {:.6f}'.format(stage, q, value))
+            lines.append('braille_captions_stage_seconds_sum{{stage="{}"}} {:.6f}'.format(stage, values["sum"]))
+            lines.append('braille_captions_stage_seconds_count{{stage="{}"}} {}'.format(stage, values["count"]))
+        for name, value in sorted(snapshot["gauges"].items()):
+            lines.append("# TYPE braille_captions_{} gauge".format(name))
+            lines.append("braille_captions_{} {}".format(name, value))
+        return "\n".join(lines) + "\n"
+
+    def summary(self, stages):
+        # short "stage p50/p99 ms" lines for the on-screen display
+        snapshot = self.snapshot()
+        lines = []
+        for stage in stages:
+            values = snapshot["stages"].get(stage)
+            if values:
+                lines.append("{} {:.1f}/{:.1f} ms".format(
+                    stage, values["quantiles"]["0.5"] * 1000, values["quantiles"]["0.99"] * 1000))
+        for name, value in sorted(snapshot["gauges"].items()):
+            lines.append("{} {}".format(name, round(value, 1) if isinstance(value, float) else value))
+        return lines
+
+    def dump(self, path, fmt="json"):
+        # write to a temp file first so readers never see half a dump
+        text = self.prometheus() if fmt == "prometheus" else json.dumps(self.snapshot(), indent=2) + "\n"
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(temp_path, path)
+
+    def start_dumping(self, path, interval=5, fmt="json"):
+        def loop():
+            while not self.dumping.wait(interval):
+                self.dump(path, fmt)
+            self.dump(path, fmt)
+
+        self.enable()
+        self.dump_thread = threading.Thread(target=loop, daemon=True)
+        self.dump_thread.start()
+
+    def stop_dumping(self):
+        # the dump thread writes once more before it ends, so the last interval isn't lost
+        self.dumping.set()
+        if self.dump_thread is not None:
+            self.dump_thread.join()
+            self.dump_thread = None
+
+
+# shared by the speech recognizer, encoder and captions, enabled from main.py
+metrics = Metrics()
@@ -0,0 +1,182 @@
+import argparse
+import json
+import multiprocessing
+import sys
+import time
+import wave
+
+import numpy as np
+
+# loaded once per worker process (inherited from the parent where processes are forked)
+model = None
+t2d = None
+
+
+def read_blocks(path, block_frames, start=0, end=None):
+    """Stream a 16-bit PCM wav file as mono int16 blocks of block_frames frames."""
+    with wave.open(path, "rb") as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError(path + ": only 16-bit PCM wav files are supported")
+        channels = wav.getnchannels()
+        end = wav.getnframes() if end is None else min(end, wav.getnframes())
+        wav.setpos(start)
+        position = start
+        while position < end:
+            data = wav.readframes(min(block_frames, end - position))
+            if not data:
+                break
+            block = np.frombuffer(data, dtype=np.int16)
+            if channels > 1:
+                # downmix to mono
+                block = block.reshape(-1, channels).mean(axis=1).astype(np.int16)
+            position += len(block)
+            yield block
+
+
+def init_worker(model_path):
+    global model, t2d
+    from text2digits import text2digits
+    from vosk import Model
+
+    if model is None:
+        model = Model(model_path)
+    if t2d is None:
+        t2d = text2digits.Text2Digits()
+
+
+def decode_chunk(task):
+    """Decode frames start to end of a wav file, returns its segments with times in the whole file."""
+    from vosk import KaldiRecognizer
+
+    path, sample_rate, start, end, block_frames = task
+    offset = start / sample_rate
+    rec = KaldiRecognizer(model, sample_rate)
+    rec.SetWords(True)
+
+    segments = []
+
+    def add(result):
+        words = result.get("result", [])
+        if not result.get("text") or not words:
+            return
+        for word in words:
+            word["start"] = round(word["start"] + offset, 3)
+            word["end"] = round(word["end"] + offset, 3)
+        segments.append({
+            "start": words[0]["start"],
+            "end": words[-1]["end"],
+            # convert number words to numbers e.g. four = 4
+            "text": t2d.convert(result["text"]),
+            "words": words,
+        })
+
+    for block in read_blocks(path, block_frames, start, end):
+        if rec.AcceptWaveform(block.tobytes()):
+            add(json.loads(rec.Result()))
+    add(json.loads(rec.FinalResult()))
+    return segments
+
+
+class OfflineSpeechToText:
+    """Transcribes wav files, decoding chunks split at silences in parallel."""
+
+    def __init__(self, model_path="small_model", workers=None, block_frames=8196,
+                 target_seconds=30, max_seconds=60, min_silence=0.5, silence_threshold=500):
+        self.model_path = model_path
+        self.workers = workers or multiprocessing.cpu_count()
+        self.block_frames = block_frames
+        # chunks end at the first long enough silence after target_seconds, or at max_seconds
+        self.target_seconds = target_seconds
+        self.max_seconds = max_seconds
+        self.min_silence = min_silence
+        # rms of a 30 ms window below this is silence
+        self.silence_threshold = silence_threshold
+        self.window_seconds = 0.03
+
+    def find_chunks(self, path):
+        # one streaming pass over the file, returns (start, end) frames of every chunk
+        with wave.open(path, "rb") as wav:
+            sample_rate, total = wav.getframerate(), wav.getnframes()
+        window = max(int(sample_rate * self.window_seconds), 1)
+        target, longest = self.target_seconds * sample_rate, self.max_seconds * sample_rate
+        min_silence = self.min_silence * sample_rate
+
+        chunks = []
+        chunk_start = 0
+        silence_start = None
+        position = 0
+        # blocks are whole windows, so only the last window can be short
+        for block in read_blocks(path, window * 1000):
+            count = -(-len(block) // window)
+            padded = np.zeros(count * window, dtype=np.float32)
+            padded[:len(block)] = block
+            rms = np.sqrt(np.mean(padded.reshape(count, window) ** 2, axis=1))
+
+            for i, silent in enumerate(rms < self.silence_threshold):
+                start = position + i * window
+                end = min(start + window, total)
+                if not silent:
+                    silence_start = None
+                elif silence_start is None:
+                    silence_start = start
+
+                if silence_start is not None and end - silence_start >= min_silence and end - chunk_start >= target:
+                    # cut in the middle of the silence
+                    cut = (silence_start + end) // 2
+                    chunks.append((chunk_start, cut))
+                    chunk_start, silence_start = cut, None
+                elif end - chunk_start >= longest:
+                    chunks.append((chunk_start, end))
+                    chunk_start, silence_start = end, None
+            position += len(block)
+
+        if chunk_start < total:
+            chunks.append((chunk_start, total))
+        return chunks, sample_rate, total
+
+    def transcribe(self, paths):
+        """Yield (path, segment) for every recognized segment in file and time order, then report the real-time factor."""
+        tasks = []
+        durations = {}
+        for path in paths:
+            chunks, sample_rate, total = self.find_chunks(path)
+            durations[path] = total / sample_rate
+            tasks += [(path, sample_rate, start, end, self.block_frames) for start, end in chunks]
+
+        started = time.perf_counter()
+        if multiprocessing.get_start_method() == "fork":
+            # load the model before forking, so every worker shares the parent's copy
+            init_worker(self.model_path)
+        with multiprocessing.Pool(self.workers, initializer=init_worker, initargs=(self.model_path,)) as pool:
+            # imap keeps chunk order, so segments come out in order as soon as their chunk is done
+            for task, segments in zip(tasks, pool.imap(decode_chunk, tasks)):
+                for segment in segments:
+                    yield task[0], segment
+
+        self.report(sum(durations.values()), time.perf_counter() - started)
+
+    def report(self, audio_seconds, elapsed):
+        # real-time factor: processing time per second of audio, below 1 is faster than real time
+        rtf = elapsed / audio_seconds if audio_seconds else 0
+        print("{:.1f} s of audio in {:.1f} s with {} workers, real-time factor {:.3f}".format(
+            audio_seconds, elapsed, self.workers, rtf), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Transcribe wav files, printing one JSON segment with word timings per line.")
+    parser.add_argument("files", nargs="+", metavar="FILENAME", help="16-bit PCM wav files")
+    parser.add_argument("-o", "--output", type=str, metavar="FILENAME", help="write segments here instead of stdout")
+    parser.add_argument("-m", "--model", type=str, default="small_model", help="vosk model directory")
+    parser.add_argument("-j", "--workers", type=int, help="decoding processes (default: one per cpu)")
+    parser.add_argument("--chunk-seconds", type=float, default=30, help="preferred chunk length, cut at the next silence")
+    args = parser.parse_args()
+
+    stt = OfflineSpeechToText(args.model, args.workers, target_seconds=args.chunk_seconds, max_seconds=args.chunk_seconds * 2)
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for path, segment in stt.transcribe(args.files):
+            output.write(json.dumps(dict(file=path, **segment), ensure_ascii=False) + "\n")
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
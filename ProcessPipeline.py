@@ -0,0 +1,114 @@
+import multiprocessing
+import queue
+import threading
+from collections import OrderedDict
+
+from TranscriptChannel import TranscriptChannel
+
+
+def recognize(updates, stop):
+    """Recognizer process: runs SpeechToText and forwards its transcript updates."""
+    from VoskSpeechToText import SpeechToText
+
+    stt = SpeechToText()
+
+    def forward():
+        for update in stt.channel.subscribe():
+            updates.put(update)
+        # tells the encoder there is nothing more to come
+        updates.put(None)
+
+    forward_thread = threading.Thread(target=forward)
+    forward_thread.start()
+    threading.Thread(target=stt.run, daemon=True).start()
+
+    stop.wait()
+    stt.stop()
+    forward_thread.join()
+
+
+def encode(updates, encoded):
+    """Encoder process: encodes every final sentence and the newest partial to braille, whole and word by word."""
+    from BrailleEncoder import BrailleEncoder
+
+    encoder = BrailleEncoder(incremental=True)
+    while True:
+        pending = [updates.get()]
+        # partials that were overtaken while waiting are skipped, finals are always encoded
+        try:
+            while pending[-1] is not None:
+                pending.append(updates.get_nowait())
+        except queue.Empty:
+            pass
+
+        for i, update in enumerate(pending):
+            if update is None:
+                encoded.put(None)
+                return
+            if update.final or i == len(pending) - 1 or pending[i + 1] is None:
+                # the second call reuses every word of the first, the encoder is incremental
+                encoded.put((update, encoder.encode_text(update.text), encoder.encode_words(update.text)))
+
+
+class ProcessPipeline:
+    """Recognition and encoding in their own processes, standing in for both the encoder and stt of the captions."""
+
+    def __init__(self, history=64):
+        # transcripts republished in this process, for BrailleVideoCaptions.speechToText
+        self.channel = TranscriptChannel()
+
+        # recent text -> (braille, braille of every word) from the encoder process
+        self.history = history
+        self.braille = OrderedDict()
+        self.braille_lock = threading.Lock()
+        self.local_encoder = None
+
+        self.stop = multiprocessing.Event()
+        self.updates = multiprocessing.Queue()
+        self.encoded = multiprocessing.Queue()
+        self.processes = [
+            multiprocessing.Process(target=recognize, args=(self.updates, self.stop), name="recognizer", daemon=True),
+            multiprocessing.Process(target=encode, args=(self.updates, self.encoded), name="encoder", daemon=True),
+        ]
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+
+    def run(self):
+        # receive encoded transcripts until the encoder shuts down
+        while True:
+            item = self.encoded.get()
+            if item is None:
+                break
+            update, braille, braille_words = item
+            with self.braille_lock:
+                self.braille[update.text] = (braille, braille_words)
+                self.braille.move_to_end(update.text)
+                while len(self.braille) > self.history:
+                    self.braille.popitem(last=False)
+            self.channel.publish(update.text, update.final, update.captured, update.words)
+        self.channel.close()
+
+    def lookup(self, sentence):
+        with self.braille_lock:
+            braille = self.braille.get(sentence)
+        if braille is not None:
+            return braille
+
+        # text that never came through the pipeline (e.g. the placeholder caption)
+        if self.local_encoder is None:
+            from BrailleEncoder import BrailleEncoder
+            self.local_encoder = BrailleEncoder()
+        return self.local_encoder.encode_text(sentence), self.local_encoder.encode_words(sentence)
+
+    def encode_text(self, sentence):
+        return self.lookup(sentence)[0]
+
+    def encode_words(self, sentence):
+        return self.lookup(sentence)[1]
+
+    def terminate(self):
+        print("Stopped Listening... ")
+        self.stop.set()
+        self.channel.close()
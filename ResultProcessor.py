@@ -0,0 +1,116 @@
+import json
+import time
+
+from text2digits import text2digits
+
+# number words can be joined across these, so a sentence is never split at one
+NUMBER_JOINERS = {"and", "point", "minus", "negative"}
+
+
+def result_text(raw, key):
+    # vosk results end with "key" : "text" }, slice the text out and leave escapes and
+    # anything unusual to json
+    start = raw.find('"' + key + '"')
+    if start != -1:
+        start = raw.find('"', raw.find(":", start) + 1) + 1
+        end = raw.find('"', start)
+        if start and end != -1 and "\\" not in raw[start:end] and raw[end + 1:].strip() == "}":
+            return raw[start:end]
+    return json.loads(raw).get(key, "")
+
+
+class ResultProcessor:
+    """Turns raw vosk results into caption text, doing as little as possible per partial.
+
+    partial() returns None when there is nothing new to show: the raw partial didn't change,
+    its text is already on screen, or the last one went out less than min_interval ago (it is
+    held back and returned by a later call instead). Number words are converted again only
+    after the last word that can't be part of a number; the converted text before it is kept
+    while the recognizer doesn't revise it.
+    """
+
+    def __init__(self, t2d=None, min_interval=0):
+        self.t2d = t2d or text2digits.Text2Digits()
+        self.min_interval = min_interval
+        # word -> True if conversion leaves it alone and it can't join two numbers
+        self.plain = {}
+        self.skipped = 0
+        self.throttled = 0
+        # word timings of the last result, when the recognizer gives them (SetWords/SetPartialWords)
+        self.word_timings = None
+        self.reset()
+
+    def reset(self):
+        # start of a new sentence
+        self.raw = None
+        self.words = []
+        # (end word index, converted text) of the stable part of the partial
+        self.segments = []
+        self.pending = None
+        self.published = ""
+        self.published_at = 0.0
+
+    def is_plain(self, word):
+        plain = self.plain.get(word)
+        if plain is None:
+            plain = word not in NUMBER_JOINERS and self.t2d.convert(word) == word
+            self.plain[word] = plain
+        return plain
+
+    def convert(self, words):
+        # drop the stable segments the recognizer has since revised
+        common = 0
+        limit = min(len(words), len(self.words))
+        while common < limit and words[common] == self.words[common]:
+            common += 1
+        while self.segments and self.segments[-1][0] > common:
+            self.segments.pop()
+        stable = self.segments[-1][0] if self.segments else 0
+
+        # the last word is the most likely to change, so it always stays in the tail
+        boundary = stable
+        for i in range(len(words) - 1, stable, -1):
+            if self.is_plain(words[i - 1]):
+                boundary = i
+                break
+        if boundary > stable:
+            self.segments.append((boundary, self.t2d.convert(" ".join(words[stable:boundary]))))
+
+        self.words = words
+        parts = [text for _, text in self.segments]
+        tail = self.t2d.convert(" ".join(words[boundary:]))
+        if tail:
+            parts.append(tail)
+        return " ".join(parts)
+
+    def partial(self, raw, now=None):
+        if raw == self.raw:
+            self.skipped += 1
+            return self.release(now)
+        self.raw = raw
+        self.word_timings = json.loads(raw).get("partial_result") if '"partial_result"' in raw else None
+        text = self.convert(result_text(raw, "partial").split())
+        if text == self.published:
+            self.pending = None
+            return None
+        self.pending = text
+        return self.release(now)
+
+    def release(self, now=None):
+        # the held back partial, once min_interval has passed since the last one went out
+        if self.pending is None:
+            return None
+        now = time.perf_counter() if now is None else now
+        if now - self.published_at < self.min_interval:
+            self.throttled += 1
+            return None
+        text, self.pending = self.pending, None
+        self.published, self.published_at = text, now
+        return text
+
+    def final(self, raw):
+        # finals come once per sentence and are always converted in full
+        self.word_timings = json.loads(raw).get("result") if '"result"' in raw else None
+        text = self.t2d.convert(result_text(raw, "text"))
+        self.reset()
+        return text
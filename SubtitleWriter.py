@@ -0,0 +1,104 @@
+import argparse
+import json
+import textwrap
+import time
+
+# north american ascii braille, in unicode braille cell order (U+2800 to U+283F)
+ASCII_BRAILLE = " A1B'K2L@CIF/MSP\"E3H9O6R^DJG>NTQ,*5<-U8V.%[$+X!&;:4\\0Z7(_?W]#Y)="
+
+# unicode braille -> brf, built once
+BRF_TABLE = str.maketrans({chr(0x2800 + i): char for i, char in enumerate(ASCII_BRAILLE)})
+
+
+def to_brf(braille):
+    return braille.translate(BRF_TABLE)
+
+
+def timestamp(seconds, separator):
+    # HH:MM:SS,mmm for srt, HH:MM:SS.mmm for webvtt
+    milliseconds = max(int(round(seconds * 1000)), 0)
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return "{:02d}:{:02d}:{:02d}{}{:03d}".format(hours, minutes, seconds, separator, milliseconds)
+
+
+class SubtitleWriter:
+    """Appends caption cues to SRT, WebVTT and BRF tracks as sentences are finished."""
+
+    def __init__(self, encoder, srt_path=None, vtt_path=None, brf_path=None, brf_width=40):
+        self.encoder = encoder
+        # cells per line of the brf track, e.g. the width of the braille display
+        self.brf_width = brf_width
+        self.cue = 0
+        self.srt = open(srt_path, "w", encoding="utf-8") if srt_path else None
+        self.vtt = open(vtt_path, "w", encoding="utf-8") if vtt_path else None
+        # brf is plain ascii, one file line per braille line, anything that isn't braille becomes ?
+        self.brf = open(brf_path, "w", encoding="ascii", errors="replace", newline="\r\n") if brf_path else None
+        if self.vtt:
+            self.vtt.write("WEBVTT\n\n")
+            self.vtt.flush()
+
+    def add_cue(self, start, end, text):
+        # each cue is written and flushed on its own, earlier cues are never touched again
+        text = text.strip()
+        if not text:
+            return
+        braille = self.encoder.encode_text(text)
+        self.cue += 1
+
+        if self.srt:
+            self.srt.write("{}\n{} --> {}\n{}\n{}\n\n".format(
+                self.cue, timestamp(start, ","), timestamp(end, ","), text, braille))
+            self.srt.flush()
+
+        if self.vtt:
+            self.vtt.write("{} --> {}\n{}\n{}\n\n".format(timestamp(start, "."), timestamp(end, "."), text, braille))
+            self.vtt.flush()
+
+        if self.brf:
+            for line in textwrap.wrap(to_brf(braille), self.brf_width):
+                self.brf.write(line + "\n")
+            self.brf.flush()
+
+    def follow(self, channel):
+        # write a cue for every final sentence published on a TranscriptChannel, timed from now
+        started = time.monotonic()
+        sentence_start = None
+        for update in channel.subscribe():
+            now = time.monotonic() - started
+            if sentence_start is None and update.text:
+                # the first partial of a sentence is when it started
+                sentence_start = now
+            if update.final:
+                self.add_cue(now if sentence_start is None else sentence_start, now, update.text)
+                sentence_start = None
+        self.close()
+
+    def close(self):
+        for track in (self.srt, self.vtt, self.brf):
+            if track:
+                track.close()
+
+
+if __name__ == "__main__":
+    from BrailleEncoder import BrailleEncoder
+
+    parser = argparse.ArgumentParser(description="Write subtitle tracks from a JSON lines transcript, e.g. from OfflineSpeechToText.py.")
+    parser.add_argument("transcript", help="JSON lines transcript with start, end and text")
+    parser.add_argument("--srt", type=str, metavar="FILENAME", help="SubRip track with print and braille lines")
+    parser.add_argument("--vtt", type=str, metavar="FILENAME", help="WebVTT track with print and braille lines")
+    parser.add_argument("--brf", type=str, metavar="FILENAME", help="ascii braille (BRF) track")
+    parser.add_argument("--brf-width", type=int, default=40, help="cells per BRF line")
+    args = parser.parse_args()
+
+    if not (args.srt or args.vtt or args.brf):
+        parser.error("nothing to write, give at least one of --srt, --vtt or --brf")
+
+    writer = SubtitleWriter(BrailleEncoder(), args.srt, args.vtt, args.brf, args.brf_width)
+    with open(args.transcript, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                segment = json.loads(line)
+                writer.add_cue(float(segment["start"]), float(segment["end"]), segment["text"])
+    writer.close()
@@ -0,0 +1,56 @@
+import threading
+from collections import deque, namedtuple
+
+# version increases by one per published update, final is True for finished sentences,
+# captured is the perf_counter() time the audio behind the update was captured (None if unknown),
+# words the recognizer's word timings and confidences, when it was asked for them
+TranscriptUpdate = namedtuple("TranscriptUpdate", ["version", "text", "final", "captured", "words"], defaults=[None, None])
+
+
+class TranscriptChannel:
+    """Hands transcript updates from the speech recognizer to any number of waiting consumers."""
+
+    def __init__(self, history=64):
+        self.condition = threading.Condition()
+        self.latest = TranscriptUpdate(0, "", False)
+        # recent updates, so consumers that fall behind still get every final sentence
+        self.updates = deque(maxlen=history)
+        self.closed = False
+
+    def publish(self, text, final=False, captured=None, words=None):
+        with self.condition:
+            if self.closed:
+                return
+            # a partial that didn't change wakes nobody
+            if not final and not self.latest.final and text == self.latest.text:
+                return
+            self.latest = TranscriptUpdate(self.latest.version + 1, text, final, captured, words)
+            self.updates.append(self.latest)
+            self.condition.notify_all()
+
+    def close(self):
+        # wake every consumer so it can shut down
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def wait(self, version=0, timeout=None):
+        # block until there are updates newer than version, returns them oldest first,
+        # [] on timeout, None once the channel is closed and nothing newer is left
+        with self.condition:
+            self.condition.wait_for(lambda: self.latest.version > version or self.closed, timeout)
+            if self.latest.version > version:
+                return [update for update in self.updates if update.version > version]
+            if self.closed:
+                return None
+            return []
+
+    def subscribe(self, version=0):
+        # iterate over updates as they arrive, until the channel is closed
+        while True:
+            updates = self.wait(version)
+            if updates is None:
+                return
+            for update in updates:
+                yield update
+            version = updates[-1].version
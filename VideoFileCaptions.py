@@ -0,0 +1,158 @@
+import argparse
+import bisect
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2 # opencv-python in package manager
+
+from BrailleCaptions import BrailleVideoCaptions
+from BrailleEncoder import BrailleEncoder
+
+
+def load_transcript(path):
+    # (start, end, text) of every segment in a JSON lines transcript, e.g. from OfflineSpeechToText.py
+    segments = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                segment = json.loads(line)
+                segments.append((float(segment["start"]), float(segment["end"]), segment["text"]))
+    return sorted(segments)
+
+
+class VideoFileCaptions:
+    """Burns braille captions into a video file, decoding, compositing and encoding frames in parallel."""
+
+    def __init__(self, workers=4, renderer="pil", hold_seconds=0.5, fourcc="mp4v"):
+        # a plain encoder: segments are encoded once each, not as growing partials
+        self.captions = BrailleVideoCaptions(BrailleEncoder(), None, renderer)
+        self.workers = workers
+        # frames decoded but not yet written, bounds memory
+        self.in_flight = workers * 4
+        # captions stay up this long after a segment ends, unless the next one starts
+        self.hold_seconds = hold_seconds
+        self.fourcc = fourcc
+
+    def caption_at(self, segments, starts, seconds):
+        i = bisect.bisect_right(starts, seconds) - 1
+        if i < 0:
+            return ""
+        start, end, text = segments[i]
+        next_start = starts[i + 1] if i + 1 < len(starts) else float("inf")
+        if seconds < min(end + self.hold_seconds, next_start):
+            return text
+        return ""
+
+    def composite(self, frame, overlay):
+        started = time.perf_counter()
+        self.captions.blendOverlay(frame, overlay)
+        return frame, time.perf_counter() - started
+
+    def render(self, input_path, segments, output_path):
+        cam = cv2.VideoCapture(input_path)
+        if not cam.isOpened():
+            raise IOError("could not open video " + input_path)
+        fps = cam.get(cv2.CAP_PROP_FPS) or 30
+        width, height = int(cam.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cam.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*self.fourcc), fps, (width, height))
+        if not writer.isOpened():
+            cam.release()
+            raise IOError("could not write video " + output_path)
+
+        starts = [start for start, _, _ in segments]
+        # futures of composited frames, in frame order
+        pending = queue.Queue(maxsize=self.in_flight)
+        busy = {"decode": 0.0, "caption": 0.0, "composite": 0.0, "encode": 0.0}
+        frames = [0]
+        # error that stopped the encode thread, decode stops queueing frames once it is set
+        failed = []
+
+        def submit(item):
+            # waits for room in the queue, False if the encode thread has failed meanwhile
+            while not failed:
+                try:
+                    pending.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def decode(pool):
+            overlay_text, overlay = None, None
+            try:
+                while True:
+                    started = time.perf_counter()
+                    ret, frame = cam.read()
+                    busy["decode"] += time.perf_counter() - started
+                    if not ret:
+                        break
+
+                    # captions are encoded and rendered once per segment, here, so workers only blend
+                    text = self.caption_at(segments, starts, frames[0] / fps)
+                    if text != overlay_text:
+                        started = time.perf_counter()
+                        overlay_text, overlay = text, self.captions.captionOverlay(text, width, height)
+                        busy["caption"] += time.perf_counter() - started
+
+                    if not submit(pool.submit(self.composite, frame, overlay)):
+                        break
+                    frames[0] += 1
+            finally:
+                submit(None)
+
+        def encode():
+            try:
+                while True:
+                    future = pending.get()
+                    if future is None:
+                        break
+                    frame, elapsed = future.result()
+                    busy["composite"] += elapsed
+                    started = time.perf_counter()
+                    writer.write(frame)
+                    busy["encode"] += time.perf_counter() - started
+            except BaseException as error:
+                failed.append(error)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(self.workers) as pool:
+            encode_thread = threading.Thread(target=encode)
+            encode_thread.start()
+            try:
+                decode(pool)
+            finally:
+                encode_thread.join()
+                cam.release()
+                writer.release()
+        wall = time.perf_counter() - started
+        if failed:
+            raise failed[0]
+
+        self.report(frames[0], fps, wall, busy)
+        return frames[0]
+
+    def report(self, frames, fps, wall, busy):
+        print("{} frames in {:.1f} s: {:.1f} frames/s, {:.1f}x real time".format(
+            frames, wall, frames / wall if wall else 0, frames / fps / wall if wall else 0))
+        for stage, seconds in busy.items():
+            # composite time is spread over the workers
+            workers = self.workers if stage == "composite" else 1
+            rate = frames * workers / seconds if seconds else float("inf")
+            print("  {:<9} {:8.1f} s busy  {:10.1f} frames/s".format(stage, seconds, rate))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Burn braille captions from a timestamped transcript into a video file.")
+    parser.add_argument("video", help="input video")
+    parser.add_argument("transcript", help="JSON lines transcript with start, end and text, e.g. from OfflineSpeechToText.py")
+    parser.add_argument("output", help="output video")
+    parser.add_argument("-j", "--workers", type=int, default=4, help="compositing threads")
+    parser.add_argument("--renderer", choices=["pil", "atlas"], default="pil", help="caption renderer")
+    parser.add_argument("--fourcc", default="mp4v", help="output codec")
+    args = parser.parse_args()
+
+    VideoFileCaptions(args.workers, args.renderer, fourcc=args.fourcc).render(
+        args.video, load_transcript(args.transcript), args.output)
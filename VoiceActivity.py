@@ -0,0 +1,117 @@
+import numpy as np
+
+GATE_MODES = ["off", "skip", "batch"]
+
+
+class EnergyVAD:
+    """Voice activity from frame energy against a running noise floor."""
+
+    def __init__(self, sample_rate, frame_seconds=0.02, threshold_db=9, min_db=35, hangover_seconds=0.3):
+        self.frame = max(int(sample_rate * frame_seconds), 1)
+        self.sample_rate = sample_rate
+        # a frame is speech this far above the noise floor, and never below min_db (int16 rms in dB)
+        self.threshold_db = threshold_db
+        self.min_db = min_db
+        # speech continues this long after the last loud frame, so word endings aren't cut
+        self.hangover_seconds = hangover_seconds
+        self.hangover = 0.0
+        self.noise_db = None
+
+    def is_speech(self, samples):
+        count = len(samples) // self.frame
+        if count == 0:
+            return self.hangover > 0
+        frames = samples[:count * self.frame].reshape(count, self.frame).astype(np.float32)
+        db = 10 * np.log10(np.mean(frames * frames, axis=1) + 1e-9)
+
+        # the floor drops straight to quieter frames and creeps up slowly
+        quietest = float(db.min())
+        if self.noise_db is None or quietest < self.noise_db:
+            self.noise_db = quietest
+        else:
+            self.noise_db += 0.05 * (quietest - self.noise_db)
+
+        seconds = len(samples) / self.sample_rate
+        if (db > max(self.noise_db + self.threshold_db, self.min_db)).any():
+            self.hangover = self.hangover_seconds
+            return True
+        if self.hangover > 0:
+            self.hangover -= seconds
+            return True
+        return False
+
+
+class VoiceActivityGate:
+    """Decides what the recognizer is fed: speech straight away, silence skipped or batched.
+
+    process() returns ("feed", bytes) and ("finalize", None) actions; finalize means a pause
+    long enough to end the sentence.
+    off: every block is fed, as without a gate
+    skip: silence is never fed
+    batch: silence is fed in batches of batch_seconds, so kaldi still sees the pauses
+    """
+
+    def __init__(self, sample_rate, mode="batch", batch_seconds=1.0, final_pause=0.8, vad=None):
+        if mode not in GATE_MODES:
+            raise ValueError("unknown voice activity mode: " + str(mode))
+        self.sample_rate = sample_rate
+        self.mode = mode
+        self.batch_seconds = batch_seconds
+        self.final_pause = final_pause
+        self.vad = vad or EnergyVAD(sample_rate)
+
+        self.batch = []
+        self.batched = 0.0
+        self.silence = 0.0
+        self.in_utterance = False
+
+        self.fed_seconds = 0.0
+        self.skipped_seconds = 0.0
+        self.feeds = 0
+        self.finals = 0
+
+    def feed(self, data, seconds):
+        self.feeds += 1
+        self.fed_seconds += seconds
+        return ("feed", data)
+
+    def flush(self):
+        # batched silence, as one block
+        data, seconds = b"".join(self.batch), self.batched
+        self.batch, self.batched = [], 0.0
+        return self.feed(data, seconds)
+
+    def process(self, samples):
+        seconds = len(samples) / self.sample_rate
+        if self.mode == "off":
+            return [self.feed(samples.tobytes(), seconds)]
+
+        actions = []
+        if self.vad.is_speech(samples):
+            if self.batch:
+                actions.append(self.flush())
+            actions.append(self.feed(samples.tobytes(), seconds))
+            self.silence = 0.0
+            self.in_utterance = True
+            return actions
+
+        self.silence += seconds
+        if self.mode == "batch":
+            self.batch.append(samples.tobytes())
+            self.batched += seconds
+            if self.batched >= self.batch_seconds:
+                actions.append(self.flush())
+        else:
+            self.skipped_seconds += seconds
+
+        if self.in_utterance and self.silence >= self.final_pause:
+            if self.batch:
+                actions.append(self.flush())
+            actions.append(("finalize", None))
+            self.finals += 1
+            self.in_utterance = False
+        return actions
+
+    def stats(self):
+        return {"fed_seconds": self.fed_seconds, "skipped_seconds": self.skipped_seconds,
+                "feeds": self.feeds, "finals": self.finals}
@@ -1,30 +1,52 @@
 import argparse
-import queue
 import sys
+import threading
+import wave
 import sounddevice as sd
-from vosk import Model, KaldiRecognizer
-import json
-from text2digits import text2digits
+from TranscriptChannel import TranscriptChannel
+from ResultProcessor import ResultProcessor
+from Metrics import metrics
+from AudioRingBuffer import AudioRingBuffer, POLICIES
+from VoiceActivity import VoiceActivityGate, GATE_MODES
 
 
 class SpeechToText:
 
     def __init__(self):
-        self.q = queue.Queue()
-        self.wav = queue.Queue()
         self.create_parser()
         self.set_sample_rate()
+        self.set_blocksize()
+        # bounded, preallocated audio queues: one for recognition, one for the --filename recording
+        self.q = AudioRingBuffer(self.args.queue_blocks, self.blocksize, policy=self.args.queue_policy)
+        self.wav = AudioRingBuffer(self.args.queue_blocks, self.blocksize) if self.args.filename else None
+        # in front of the recognizer: speech is fed straight away, silence skipped or batched
+        self.gate = VoiceActivityGate(self.args.samplerate, self.args.vad, final_pause=self.args.final_pause)
         self.load_model()
         self.running = True
-        self.t2d = text2digits.Text2Digits()
+        # parses results and converts number words to numbers e.g. four = 4
+        self.results = ResultProcessor(min_interval=1 / self.args.partial_rate if self.args.partial_rate else 0)
+        self.t2d = self.results.t2d
         self.partial_text = ""
         self.text = ""
+        # consumers wait on this instead of polling partial_text/text
+        self.channel = TranscriptChannel()
+        # finished sentences only, for consumers that don't need the partials
+        self.finals = TranscriptChannel()
 
     def terminate(self):
         print("Stopped Listening... ")
-        self.running = False
+        self.stop()
         exit(0)
 
+    def stop(self):
+        # ends run() and the recording, and wakes anyone waiting on the channel
+        self.running = False
+        self.channel.close()
+        self.finals.close()
+        self.q.close()
+        if self.wav is not None:
+            self.wav.close()
+
     def int_or_str(self, text):
         """Helper function for argument parsing."""
         try:
@@ -36,8 +58,11 @@ class SpeechToText:
         """This is called (from a separate thread) for each audio block."""
         if status:
             print(status, file=sys.stderr)
-        self.q.put(bytes(indata))
-        self.wav.put(indata)
+        # copied into the ring buffers with the time it was captured, for the speech to caption latency
+        captured = metrics.clock()
+        self.q.put(indata, captured)
+        if self.wav is not None:
+            self.wav.put(indata, captured)
 
     def create_parser(self):
         self.parser = argparse.ArgumentParser(add_help=False)
@@ -53,6 +78,17 @@ class SpeechToText:
         self.parser.add_argument("-f", "--filename", type=str, metavar="FILENAME", help="audio file to store recording to")
         self.parser.add_argument("-d", "--device", type=self.int_or_str, help="input device (numeric ID or substring)")
         self.parser.add_argument("-r", "--samplerate", type=int, help="sampling rate")
+        self.parser.add_argument("--queue-blocks", type=int, default=32, help="audio blocks buffered before the queue policy applies, their length depends on --blocksize (~0.5 s, 0.1 s with --vad)")
+        self.parser.add_argument("--queue-policy", choices=POLICIES, default="drop_oldest",
+                                 help="when recognition falls behind: drop the oldest audio, merge blocks, or block the audio callback")
+        self.parser.add_argument("--blocksize", type=int, help="audio frames per block (default 8196, or 0.1 s with --vad)")
+        self.parser.add_argument("--vad", choices=GATE_MODES, default="off",
+                                 help="voice activity gating: feed every block, skip silence, or feed silence in 1 s batches")
+        self.parser.add_argument("--partial-rate", type=float, default=0,
+                                 help="publish partial results at most this many times a second, e.g. the display refresh rate")
+        self.parser.add_argument("--word-timings", action="store_true",
+                                 help="publish word timings and confidences with the transcript, for the word caption layout")
+        self.parser.add_argument("--final-pause", type=float, default=0.8, help="seconds of silence that end a sentence with --vad")
 
         self.args = self.parser.parse_args(self.remaining)
 
@@ -62,35 +98,106 @@ class SpeechToText:
             # soundfile expects an int, sounddevice provides a float:
             self.args.samplerate = int(device_info["default_samplerate"])
 
+    def set_blocksize(self):
+        # small blocks give faster partials, which only pays off when silence isn't fed block by block
+        if self.args.blocksize:
+            self.blocksize = self.args.blocksize
+        elif self.args.vad == "off":
+            self.blocksize = 8196
+        else:
+            self.blocksize = self.args.samplerate // 10
+
     def load_model(self):
+        # vosk is slow to import, only pay for it once the model is needed
+        from vosk import Model
+
         print("\nLoading Model... ")
         self.model = Model("small_model")
         print("\nModel Loaded... ")
 
+    def record(self):
+        # stream the recording to --filename as it comes in
+        with wave.open(self.args.filename, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(self.args.samplerate)
+            while True:
+                block = self.wav.get()
+                if block is None:
+                    break
+                f.writeframes(block[1])
+
     def run(self):
+        from vosk import KaldiRecognizer
+
+        if self.wav is not None:
+            record_thread = threading.Thread(target=self.record)
+            record_thread.start()
+
         with sd.RawInputStream(
-                samplerate=self.args.samplerate, blocksize = 8196, device=self.args.device,
+                samplerate=self.args.samplerate, blocksize = self.blocksize, device=self.args.device,
                 dtype="int16", channels=1, callback=self.callback):
 
             print("Listening... ")
 
             rec = KaldiRecognizer(self.model, self.args.samplerate)
+            if self.args.word_timings:
+                rec.SetWords(True)
+                rec.SetPartialWords(True)
 
             self.text = ""
             self.partial_text = ""
 
             while self.running:
-                self.data = self.q.get()
-
-                if rec.AcceptWaveform(self.data):
-                    # final sentence, can be added to a txt file
-                    result = rec.Result()
-                    # convert number words to numbers e.g. four = 4
-                    self.text = self.t2d.convert(json.loads(result)["text"])
-                else:
-                    # unfinished sentence
-                    partial_result = rec.PartialResult()
-                    # convert number words to numbers e.g. four = 4
-                    self.partial_text = self.t2d.convert(json.loads(partial_result)["partial"])
-
+                block = self.q.get(timeout=1)
+                if block is None:
+                    continue
+                captured, samples = block
+                metrics.record("audio_queue", captured)
+                metrics.gauge("audio_queue_depth", self.q.qsize())
+                metrics.gauge("audio_dropped_blocks", self.q.dropped)
+                metrics.gauge("audio_late_blocks", self.q.late)
+                if self.wav is not None:
+                    metrics.gauge("wav_queue_depth", self.wav.qsize())
+                    metrics.gauge("wav_dropped_blocks", self.wav.dropped)
+
+                for action, data in self.gate.process(samples):
+                    if action == "feed":
+                        self.accept(rec, data, captured)
+                    else:
+                        self.finalize(rec, captured)
+                metrics.gauge("vad_skipped_seconds", round(self.gate.skipped_seconds, 1))
+                metrics.gauge("vad_finals", self.gate.finals)
+
+    def accept(self, rec, data, captured):
+        self.data = data
+        start = metrics.clock()
+        accepted = rec.AcceptWaveform(self.data)
+        metrics.record("accept_waveform", start)
+
+        if accepted:
+            # final sentence
+            self.publish_final(self.results.final(rec.Result()), captured)
+        else:
+            # unfinished sentence, None when there is nothing new to show
+            start = metrics.clock()
+            partial_text = self.results.partial(rec.PartialResult())
+            metrics.record("partial_results", start)
+            metrics.gauge("partials_skipped", self.results.skipped)
+            metrics.gauge("partials_throttled", self.results.throttled)
+            if partial_text is not None:
+                self.partial_text = partial_text
+                self.channel.publish(self.partial_text, captured=captured, words=self.results.word_timings)
+
+    def finalize(self, rec, captured):
+        # a long pause ends the sentence, FinalResult also resets the recognizer for the next one
+        text = self.results.final(rec.FinalResult())
+        if text:
+            self.publish_final(text, captured)
+        self.partial_text = ""
 
+    def publish_final(self, text, captured):
+        self.text = text
+        self.channel.publish(self.text, final=True, captured=captured, words=self.results.word_timings)
+        if self.text:
+            self.finals.publish(self.text, final=True, captured=captured, words=self.results.word_timings)
@@ -0,0 +1,62 @@
+"""Glyph atlas vs PIL rendering of braille caption lines.
+
+Run from the repository root:
+    python -m benchmarks.atlas [--runs N]
+
+pil: font.getbbox + ImageDraw.text into a line image + np.asarray, as drawCaptions does per line
+atlas: GlyphAtlas.compose of the same line
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from GlyphAtlas import GlyphAtlas, BRAILLE_CELLS
+
+FONT_PATH = "./SimBraille.ttf"
+FONT_SIZE = 28
+
+
+def pil_line(font, line):
+    left, top, right, bottom = font.getbbox(line)
+    img = Image.new("L", (right, bottom), 0)
+    ImageDraw.Draw(img).text((0, 0), line, font=font, fill=255)
+    return np.asarray(img)
+
+
+def time_per_line(render, lines, runs):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        for line in lines:
+            render(line)
+        elapsed = (time.perf_counter() - start) / len(lines)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--runs", type=int, default=5, help="runs per line length, best is reported")
+    parser.add_argument("-l", "--lines", type=int, default=200, help="lines per run")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    atlas = GlyphAtlas(FONT_PATH, FONT_SIZE, BRAILLE_CELLS)
+    print("atlas built in {:.2f} ms, {} glyphs, {}x{} px".format(
+        (time.perf_counter() - start) * 1000, len(atlas.glyphs), atlas.atlas.shape[1], atlas.atlas.shape[0]))
+
+    font = ImageFont.truetype(FONT_PATH, FONT_SIZE)
+    rng = random.Random(0)
+    print("{:>6} {:>12} {:>12} {:>9}".format("cells", "pil us", "atlas us", "speedup"))
+    for cells in (20, 40, 60, 80):
+        lines = ["".join(rng.choice(BRAILLE_CELLS) for _ in range(cells)) for _ in range(args.lines)]
+        pil_time = time_per_line(lambda line: pil_line(font, line), lines, args.runs)
+        atlas_time = time_per_line(atlas.compose, lines, args.runs)
+        print("{:>6} {:>12.1f} {:>12.1f} {:>8.1f}x".format(cells, pil_time * 1e6, atlas_time * 1e6, pil_time / atlas_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Frame rate and per-frame allocations of the video loop, from a synthetic camera.
+
+Run from the repository root:
+    python -m benchmarks.frames [--seconds S]
+
+copying: the loop as it was, cam.read() and cv2.flip returning new frames every time
+buffered: FrameGrabber reading into reused buffers on its own thread, composeFrame flipping
+    and captioning in place
+buffered_half: as buffered, with the window shown at half size
+Nothing is shown on screen. compose is the time from having a frame to it being ready to show,
+allocated the peak memory allocated meanwhile; fps is limited by the camera (--fps, 0 for none).
+"""
+import argparse
+import time
+import tracemalloc
+
+import cv2
+
+from BrailleCaptions import BrailleVideoCaptions
+from BrailleEncoder import BrailleEncoder
+from FrameSource import FrameGrabber, SyntheticCamera
+
+RESOLUTIONS = [(1280, 720), (1920, 1080), (3840, 2160)]
+
+TEXT = "today we will look at the structure of the braille code"
+
+
+def copying(captions, cam, seconds):
+    width, height = cam.width, cam.height
+    compose, allocated = [], []
+    frames, start = 0, time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        ret, img = cam.read()
+        compose_start = time.perf_counter()
+        img = cv2.flip(img, 1)
+        captions.blendOverlay(img, captions.captionOverlay(TEXT, width, height))
+        compose.append(time.perf_counter() - compose_start)
+        allocated.append(tracemalloc.get_traced_memory()[1] - before)
+        frames += 1
+    return frames / (time.perf_counter() - start), compose, allocated
+
+
+def buffered(captions, cam, seconds):
+    grabber = FrameGrabber(cam).start()
+    compose, allocated = [], []
+    frames, start = 0, time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        img = grabber.read()
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        compose_start = time.perf_counter()
+        captions.composeFrame(img, TEXT)
+        compose.append(time.perf_counter() - compose_start)
+        allocated.append(tracemalloc.get_traced_memory()[1] - before)
+        frames += 1
+    fps = frames / (time.perf_counter() - start)
+    grabber.stop()
+    return fps, compose, allocated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-s", "--seconds", type=float, default=3, help="length of each run")
+    parser.add_argument("--fps", type=float, default=60, help="camera frame rate")
+    args = parser.parse_args()
+
+    captions = BrailleVideoCaptions(BrailleEncoder())
+    tracemalloc.start()
+    print("{:<10} {:<14} {:>7} {:>16} {:>16} {:>16}".format(
+        "frame", "path", "fps", "compose p50", "compose p99", "allocated p50"))
+    for width, height in RESOLUTIONS:
+        # render the overlay once, so every path measures blending a cached caption
+        captions.captionOverlay(TEXT, width, height)
+        for name in ("copying", "buffered", "buffered_half"):
+            captions.display_scale = 0.5 if name == "buffered_half" else 1
+            cam = SyntheticCamera(width, height, args.fps)
+            run = copying if name == "copying" else buffered
+            fps, compose, allocated = run(captions, cam, args.seconds)
+            # the first frames fill the buffers
+            compose, allocated = sorted(compose[2:] or compose), sorted(allocated[2:] or allocated)
+            print("{:<10} {:<14} {:>7.1f} {:>13.2f} ms {:>13.2f} ms {:>13.0f} KB".format(
+                "{}x{}".format(width, height), name, fps, compose[len(compose) // 2] * 1000,
+                compose[min(int(len(compose) * 0.99), len(compose) - 1)] * 1000, allocated[len(allocated) // 2] / 1024))
+
+
+if __name__ == "__main__":
+    main()
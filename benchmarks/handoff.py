@@ -0,0 +1,133 @@
+"""CPU use and caption frame rate with the polling vs event driven transcript handoff.
+
+Run from the repository root:
+    python -m benchmarks.handoff [--seconds S] [--session FILE]
+
+A session is replayed into a stand-in for SpeechToText (partial_text and channel),
+while a video loop blends captions onto 1080p frames as videoCaptioning does.
+poll: the old speechToText loop, copying stt.partial_text as fast as it can
+event: BrailleVideoCaptions.speechToText waiting on the TranscriptChannel
+A session file has one "seconds<TAB>text<TAB>partial|final" update per line.
+"""
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from BrailleCaptions import BrailleVideoCaptions
+from BrailleEncoder import BrailleEncoder
+from TranscriptChannel import TranscriptChannel
+
+SENTENCES = [
+    "today we will look at the structure of the braille code",
+    "each cell has six dots in two columns of three",
+    "contractions make the text shorter for the reader",
+]
+
+
+class ReplayedSpeech:
+    # the attributes of SpeechToText that the captioner reads
+    def __init__(self):
+        self.partial_text = ""
+        self.text = ""
+        self.channel = TranscriptChannel()
+
+
+def synthetic_session(seconds, word_seconds=0.25):
+    # one partial per new word, a final at the end of each sentence
+    updates = []
+    at = 0.0
+    while at < seconds:
+        for sentence in SENTENCES:
+            words = sentence.split()
+            for i in range(1, len(words) + 1):
+                at += word_seconds
+                updates.append((at, " ".join(words[:i]), i == len(words)))
+    return [update for update in updates if update[0] < seconds]
+
+
+def load_session(path):
+    updates = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                at, text, kind = line.rstrip("\n").split("\t")
+                updates.append((float(at), text, kind == "final"))
+    return updates
+
+
+def replay(stt, session, stop):
+    start = time.perf_counter()
+    for at, text, final in session:
+        delay = at - (time.perf_counter() - start)
+        if delay > 0 and stop.wait(delay):
+            break
+        if final:
+            stt.text = text
+        else:
+            stt.partial_text = text
+        stt.channel.publish(text, final)
+
+
+def poll_handoff(captions):
+    # the busy loop speechToText used to be
+    while True:
+        if captions.running:
+            if captions.stt is not None:
+                captions.speech_text = captions.stt.partial_text
+        if captions.terminated:
+            break
+
+
+def run(mode, session, seconds):
+    stt = ReplayedSpeech()
+    captions = BrailleVideoCaptions(BrailleEncoder(incremental=True), stt)
+    stop = threading.Event()
+    handoff_cpu = []
+
+    def handoff():
+        start = time.thread_time()
+        if mode == "poll":
+            poll_handoff(captions)
+        else:
+            captions.speechToText()
+        handoff_cpu.append(time.thread_time() - start)
+
+    threads = [threading.Thread(target=handoff), threading.Thread(target=replay, args=(stt, session, stop))]
+    frame = np.random.default_rng(0).integers(0, 256, (1080, 1920, 3), dtype=np.uint8)
+
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    captions.running = True
+    for thread in threads:
+        thread.start()
+    frames = 0
+    while time.perf_counter() - wall_start < seconds:
+        img = frame.copy()
+        captions.blendOverlay(img, captions.captionOverlay(captions.speech_text, 1920, 1080))
+        frames += 1
+    captions.terminated = True
+    stop.set()
+    stt.channel.close()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    return frames / wall, cpu / wall, handoff_cpu[0] / wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-s", "--seconds", type=float, default=10, help="length of each run")
+    parser.add_argument("--session", type=str, help="recorded session to replay instead of the built in one")
+    args = parser.parse_args()
+
+    session = load_session(args.session) if args.session else synthetic_session(args.seconds)
+    print("{:<6} {:>8} {:>12} {:>14}".format("mode", "fps", "cpu cores", "handoff cores"))
+    for mode in ("poll", "event"):
+        fps, cores, handoff_cores = run(mode, session, args.seconds)
+        print("{:<6} {:>8.1f} {:>12.2f} {:>14.3f}".format(mode, fps, cores, handoff_cores))
+
+
+if __name__ == "__main__":
+    main()
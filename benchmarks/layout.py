@@ -0,0 +1,57 @@
+"""Caption update cost against sentence length, wrapping the whole caption vs the word layout.
+
+Run from the repository root:
+    python -m benchmarks.layout [--renderer atlas]
+
+A sentence grows one word per partial, as the recognizer delivers it. Each update is laid out
+and its overlay rendered at 1280x720:
+wrap: textwrap of the whole sentence and its braille, as before
+words: CaptionModel.update, then the visible lines
+"""
+import argparse
+import random
+import statistics
+import time
+
+from BrailleCaptions import BrailleVideoCaptions
+from BrailleEncoder import BrailleEncoder
+
+LENGTHS = [10, 40, 160]
+
+WORDS = ("today we will look at the structure of the braille code and how each cell is "
+         "read by the fingers one row at a time with twenty one examples").split()
+
+
+def run(layout, renderer, length):
+    captions = BrailleVideoCaptions(BrailleEncoder(incremental=True), None, renderer, layout)
+    captions.caption_width = round(1280 * 0.6)
+    rng = random.Random(0)
+    sentence = [rng.choice(WORDS) for _ in range(length)]
+    times = []
+    for i in range(1, length + 1):
+        text = " ".join(sentence[:i])
+        start = time.perf_counter()
+        if captions.caption_model is not None:
+            captions.caption_model.update(text)
+            caption = captions.caption_model.visible()
+        else:
+            caption = text
+        captions.captionOverlay(caption, 1280, 720)
+        times.append(time.perf_counter() - start)
+    # the last words, where the sentence is longest
+    return statistics.median(times[-5:]) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--renderer", choices=["pil", "atlas"], default="pil", help="caption renderer")
+    args = parser.parse_args()
+
+    print("{:<6} {}".format("layout", " ".join("{:>12}".format("{} words".format(length)) for length in LENGTHS)))
+    for layout in ("wrap", "words"):
+        print("{:<6} {}".format(layout, " ".join(
+            "{:>9.2f} ms".format(run(layout, args.renderer, length)) for length in LENGTHS)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Cold and warm BrailleEncoder construction times.
+
+Run from the repository root:
+    python -m benchmarks.startup [--runs N]
+
+cold: new interpreter, no precompiled codex (imports + csv build + save)
+warm start: new interpreter, precompiled codex already saved
+warm: BrailleEncoder() again in a process that already has one
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from BrailleCodex import CODEX_PATH
+
+CONSTRUCT = (
+    "import time\n"
+    "start = time.perf_counter()\n"
+    "from BrailleEncoder import BrailleEncoder\n"
+    "BrailleEncoder()\n"
+    "print(time.perf_counter() - start)\n"
+)
+
+
+def time_process():
+    output = subprocess.run([sys.executable, "-c", CONSTRUCT], capture_output=True, text=True, check=True).stdout
+    return float(output.split()[-1])
+
+
+def report(name, times):
+    print("{:<11} median {:8.2f} ms   min {:8.2f} ms   ({} runs)".format(
+        name, statistics.median(times) * 1000, min(times) * 1000, len(times)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--runs", type=int, default=5, help="runs per measurement")
+    args = parser.parse_args()
+
+    cold = []
+    for _ in range(args.runs):
+        if os.path.exists(CODEX_PATH):
+            os.remove(CODEX_PATH)
+        cold.append(time_process())
+    report("cold", cold)
+
+    report("warm start", [time_process() for _ in range(args.runs)])
+
+    from BrailleEncoder import BrailleEncoder
+    BrailleEncoder()
+    warm = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        BrailleEncoder()
+        warm.append(time.perf_counter() - start)
+    report("warm", warm)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""Benchmarks for the braille encoder, caption drawing and speech recognition, with a golden corpus check.
+
+Run from the repository root:
+    python -m benchmarks.suite [--output results.json] [--compare previous.json]
+
+encoder: every golden sentence must encode to its recorded braille with every engine, then
+    words/s and p50/p99 latency per sentence, grouped by sentence length
+captions: overlay rendering (new text) and blending (cached text) on synthetic frames per resolution
+stt: KaldiRecognizer on generated 16 kHz audio with the bundled model, skipped if it can't be loaded
+
+Results are written as JSON; --compare prints each timing against an earlier results file.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+from BrailleCaptions import BrailleVideoCaptions
+from BrailleEncoder import BrailleEncoder
+
+GOLDEN_PATH = os.path.join(os.path.dirname(__file__), "golden_corpus.tsv")
+
+ENGINES = ["trie", "legacy"]
+
+# sentence lengths in words, for the latency groups
+LENGTHS = [(1, 5), (6, 15), (16, 40), (41, 120)]
+
+RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080), (3840, 2160)]
+
+
+# the corpus is a regression snapshot of the encoder's own output, not a UEB reference
+GOLDEN_HEADER = [
+    "# Regression snapshot: sentence <tab> braille as BrailleEncoder encoded it when recorded.",
+    "# Not a UEB reference, it keeps the codex's known errors (e.g. i is dots 25 \u2812 instead of dots 24 \u280a).",
+    "# Re-record with: python -m benchmarks.suite --update-golden",
+]
+
+
+def load_golden(path=GOLDEN_PATH):
+    with open(path, encoding="utf-8") as f:
+        return [line.rstrip("\n").split("\t") for line in f if line.strip() and not line.startswith("#")]
+
+
+def update_golden(path=GOLDEN_PATH):
+    # re-record the snapshot with the legacy engine, e.g. after changing the codex
+    encoder = BrailleEncoder(engine="legacy", cache_size=0)
+    golden = load_golden(path)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(GOLDEN_HEADER) + "\n")
+        for sentence, _ in golden:
+            f.write(sentence + "\t" + encoder.encode_text(sentence) + "\n")
+    print("Updated " + str(len(golden)) + " sentences in " + path)
+
+
+def percentiles(times):
+    times = sorted(times)
+    return {
+        "p50_us": times[len(times) // 2] * 1e6,
+        "p99_us": times[min(int(len(times) * 0.99), len(times) - 1)] * 1e6,
+    }
+
+
+def check_golden(golden):
+    failures = {}
+    for engine in ENGINES:
+        encoder = BrailleEncoder(engine=engine, cache_size=0)
+        failed = [sentence for sentence, expected in golden if encoder.encode_text(sentence) != expected]
+        if failed:
+            failures[engine] = failed
+    return failures
+
+
+def bench_encoder(golden, rounds):
+    rng = random.Random(0)
+    words = " ".join(sentence for sentence, _ in golden).split()
+    sentences = {}
+    for low, high in LENGTHS:
+        sentences["{}-{}".format(low, high)] = [
+            " ".join(rng.choice(words) for _ in range(rng.randint(low, high))) for _ in range(50)]
+
+    results = {}
+    # cache_size=0 measures the engine itself, the default cache shows repeated text
+    for engine, cache_size in [("trie", 0), ("legacy", 0), ("trie", 4096)]:
+        name = engine if cache_size == 0 else engine + "_cached"
+        encoder = BrailleEncoder(engine=engine, cache_size=cache_size)
+        results[name] = {}
+        for group, group_sentences in sentences.items():
+            times = []
+            word_count = 0
+            for _ in range(rounds):
+                for sentence in group_sentences:
+                    start = time.perf_counter()
+                    encoder.encode_text(sentence)
+                    times.append(time.perf_counter() - start)
+                    word_count += len(sentence.split())
+            results[name][group] = dict(words_per_s=word_count / sum(times), **percentiles(times))
+
+        # a growing partial, as the caption loop sees it
+        incremental = BrailleEncoder(engine=engine, cache_size=cache_size, incremental=True)
+        partial = sentences["41-120"][0].split()
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for i in range(1, len(partial) + 1):
+                incremental.encode_text(" ".join(partial[:i]))
+        results[name]["incremental_partial_us"] = (time.perf_counter() - start) / (rounds * len(partial)) * 1e6
+    return results
+
+
+def bench_captions(rounds):
+    text = "today we will look at the structure of the braille code"
+    results = {}
+    for renderer in ("pil", "atlas"):
+        captions = BrailleVideoCaptions(BrailleEncoder(), None, renderer)
+        results[renderer] = {}
+        for width, height in RESOLUTIONS:
+            frame = np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+            render_times = []
+            for i in range(rounds):
+                start = time.perf_counter()
+                overlay = captions.captionOverlay(text + " " + str(i), width, height)
+                render_times.append(time.perf_counter() - start)
+
+            blend_times = []
+            for _ in range(rounds * 10):
+                img = frame.copy()
+                start = time.perf_counter()
+                captions.blendOverlay(img, captions.captionOverlay(text + " 0", width, height))
+                blend_times.append(time.perf_counter() - start)
+
+            results[renderer]["{}x{}".format(width, height)] = {
+                "render_ms": statistics.median(render_times) * 1000,
+                "blend_ms": statistics.median(blend_times) * 1000,
+                "blend_p99_ms": percentiles(blend_times)["p99_us"] / 1000,
+            }
+    return results
+
+
+def generate_wav(path, seconds, sample_rate=16000):
+    # bursts of harmonic tones separated by quiet gaps, enough to keep the recognizer busy
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pitch = 120 + 40 * np.sin(2 * np.pi * 0.3 * t)
+    audio = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in range(1, 6))
+    audio *= (np.sin(2 * np.pi * 0.5 * t) > -0.3)
+    audio = audio / np.abs(audio).max() * 8000 + rng.normal(0, 100, len(t))
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(audio.astype(np.int16).tobytes())
+
+
+def bench_stt(seconds, model_path="small_model", block_frames=8196):
+    try:
+        from vosk import Model, KaldiRecognizer, SetLogLevel
+        SetLogLevel(-1)
+        model = Model(model_path)
+    except Exception as e:
+        return {"skipped": "could not load the vosk model: " + str(e)}
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "speech.wav")
+        generate_wav(path, seconds)
+        with wave.open(path, "rb") as wav:
+            sample_rate = wav.getframerate()
+            data = wav.readframes(wav.getnframes())
+
+    rec = KaldiRecognizer(model, sample_rate)
+    block_bytes = block_frames * 2
+    times = []
+    start = time.perf_counter()
+    for offset in range(0, len(data), block_bytes):
+        block_start = time.perf_counter()
+        if rec.AcceptWaveform(data[offset:offset + block_bytes]):
+            rec.Result()
+        else:
+            rec.PartialResult()
+        times.append(time.perf_counter() - block_start)
+    rec.FinalResult()
+    elapsed = time.perf_counter() - start
+    return dict(audio_s=seconds, real_time_factor=elapsed / seconds, block_frames=block_frames,
+                **{key.replace("_us", "_ms"): value / 1000 for key, value in percentiles(times).items()})
+
+
+def flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, prefix + key + "."))
+        elif isinstance(value, (int, float)):
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(results, previous):
+    # ratio > 1 is slower for times, faster for rates
+    current, before = flatten(results["results"]), flatten(previous["results"])
+    print("{:<55} {:>12} {:>12} {:>8}".format("metric", "before", "now", "ratio"))
+    for key in sorted(current):
+        if key in before and before[key]:
+            print("{:<55} {:>12.2f} {:>12.2f} {:>8.2f}".format(key, before[key], current[key], current[key] / before[key]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-o", "--output", type=str, metavar="FILENAME", help="write results JSON here")
+    parser.add_argument("-c", "--compare", type=str, metavar="FILENAME", help="earlier results JSON to compare with")
+    parser.add_argument("-r", "--rounds", type=int, default=5, help="repetitions per measurement")
+    parser.add_argument("--stt-seconds", type=float, default=30, help="length of the generated audio")
+    parser.add_argument("--only", choices=["encoder", "captions", "stt"], action="append", help="run only these benchmarks")
+    parser.add_argument("--update-golden", action="store_true", help="re-record the golden corpus (a regression snapshot of the current encoder, not a UEB reference) and exit")
+    args = parser.parse_args()
+
+    if args.update_golden:
+        update_golden()
+        return
+
+    golden = load_golden()
+    failures = check_golden(golden)
+    if failures:
+        for engine, sentences in failures.items():
+            for sentence in sentences:
+                print("golden mismatch ({}): {}".format(engine, sentence), file=sys.stderr)
+        sys.exit(1)
+    print("golden corpus: {} sentences match with {}".format(len(golden), ", ".join(ENGINES)))
+
+    only = args.only or ["encoder", "captions", "stt"]
+    results = {}
+    if "encoder" in only:
+        results["encoder"] = bench_encoder(golden, args.rounds)
+    if "captions" in only:
+        results["captions"] = bench_captions(args.rounds)
+    if "stt" in only:
+        results["stt"] = bench_stt(args.stt_seconds)
+
+    report = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                    "processor": platform.processor(), "cpus": os.cpu_count()},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Recognition latency and CPU per block size and voice activity gating mode.
+
+Run from the repository root:
+    python -m benchmarks.vad [--wav recording.wav] [--seconds S]
+
+Each setting replays the audio block by block through the VoiceActivityGate and a
+KaldiRecognizer, as SpeechToText.run does, as fast as it can.
+latency: block length (the wait for the block to fill) plus the time spent on it, p50/p99
+cpu: recognizer and gate CPU seconds per second of audio
+fed: share of the audio the recognizer saw, feeds: AcceptWaveform calls
+Without a loadable model only the gate is measured.
+"""
+import argparse
+import time
+import wave
+
+import numpy as np
+
+from VoiceActivity import VoiceActivityGate
+
+SETTINGS = [(8196, "off"), (4000, "off"), (1600, "off"), (1600, "batch"), (1600, "skip"), (800, "batch")]
+
+
+def lecture_audio(seconds, sample_rate=16000):
+    # voiced bursts of 1-4 s between pauses of 0.2-2 s, over a little background noise
+    rng = np.random.default_rng(0)
+    audio = rng.normal(0, 60, int(seconds * sample_rate))
+    at = 0.5
+    while at < seconds:
+        length = rng.uniform(1, 4)
+        t = np.arange(int(min(length, seconds - at) * sample_rate)) / sample_rate
+        pitch = rng.uniform(100, 180) + 30 * np.sin(2 * np.pi * 3 * t)
+        burst = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in range(1, 6))
+        # syllable rate amplitude
+        burst *= 0.6 + 0.4 * np.sin(2 * np.pi * 4 * t)
+        start = int(at * sample_rate)
+        audio[start:start + len(t)] += burst * 3000
+        at += length + rng.uniform(0.2, 2)
+    return np.clip(audio, -32768, 32767).astype(np.int16), sample_rate
+
+
+def load_wav(path):
+    with wave.open(path, "rb") as f:
+        if f.getnchannels() != 1 or f.getsampwidth() != 2:
+            raise SystemExit(path + ": expected 16-bit mono wav")
+        return np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16), f.getframerate()
+
+
+def load_model(model_path):
+    try:
+        from vosk import Model, SetLogLevel
+        SetLogLevel(-1)
+        return Model(model_path)
+    except Exception as e:
+        print("recognizer skipped, could not load the vosk model: " + str(e))
+        return None
+
+
+def run(audio, sample_rate, blocksize, mode, model):
+    gate = VoiceActivityGate(sample_rate, mode)
+    rec = None
+    if model is not None:
+        from vosk import KaldiRecognizer
+        rec = KaldiRecognizer(model, sample_rate)
+
+    latencies = []
+    gate_cpu = 0.0
+    cpu_start = time.process_time()
+    for offset in range(0, len(audio) - blocksize + 1, blocksize):
+        start = time.perf_counter()
+        gate_start = time.process_time()
+        actions = gate.process(audio[offset:offset + blocksize])
+        gate_cpu += time.process_time() - gate_start
+        for action, data in actions:
+            if rec is None:
+                continue
+            if action == "finalize":
+                rec.FinalResult()
+            elif rec.AcceptWaveform(data):
+                rec.Result()
+            else:
+                rec.PartialResult()
+        if actions:
+            latencies.append(blocksize / sample_rate + time.perf_counter() - start)
+    cpu = time.process_time() - cpu_start
+
+    seconds = len(audio) / sample_rate
+    latencies.sort()
+    stats = gate.stats()
+    return {
+        "p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else 0,
+        "p99_ms": latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)] * 1000 if latencies else 0,
+        "cpu": cpu / seconds,
+        "gate_cpu": gate_cpu / seconds,
+        "fed": stats["fed_seconds"] / seconds,
+        "feeds": stats["feeds"],
+        "finals": stats["finals"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--wav", type=str, help="16-bit mono recording to replay instead of generated audio")
+    parser.add_argument("-s", "--seconds", type=float, default=60, help="length of the generated audio")
+    parser.add_argument("-m", "--model", type=str, default="small_model", help="vosk model directory")
+    args = parser.parse_args()
+
+    audio, sample_rate = load_wav(args.wav) if args.wav else lecture_audio(args.seconds)
+    model = load_model(args.model)
+
+    print("{:<10} {:<6} {:>9} {:>9} {:>8} {:>9} {:>6} {:>6} {:>7}".format(
+        "blocksize", "vad", "p50 ms", "p99 ms", "cpu", "gate cpu", "fed", "feeds", "finals"))
+    for blocksize, mode in SETTINGS:
+        result = run(audio, sample_rate, blocksize, mode, model)
+        print("{:<10} {:<6} {:>9.1f} {:>9.1f} {:>8.4f} {:>9.5f} {:>6.0%} {:>6} {:>7}".format(
+            blocksize, mode, result["p50_ms"], result["p99_ms"], result["cpu"], result["gate_cpu"],
+            result["fed"], result["feeds"], result["finals"]))
+
+
+if __name__ == "__main__":
+    main()
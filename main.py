@@ -1,19 +1,81 @@
 from BrailleCaptions import BrailleVideoCaptions
 from BrailleEncoder import BrailleEncoder
 from VoskSpeechToText import SpeechToText
+from ProcessPipeline import ProcessPipeline
+from SubtitleWriter import SubtitleWriter
+from Metrics import metrics
+import argparse
+import sys
 import time
 
 from threading import Thread
 
-stt = SpeechToText()
-transcriber = BrailleVideoCaptions(BrailleEncoder(), stt)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--pipeline", choices=["threads", "processes"], default="threads",
+                        help="run recognition and encoding as threads in this process, or in their own processes")
+    parser.add_argument("--srt", type=str, metavar="FILENAME", help="also write captions to a SubRip track")
+    parser.add_argument("--vtt", type=str, metavar="FILENAME", help="also write captions to a WebVTT track")
+    parser.add_argument("--brf", type=str, metavar="FILENAME", help="also write captions to an ascii braille (BRF) track")
+    parser.add_argument("--no-video", action="store_true", help="only write the caption tracks, stop with ctrl+c")
+    parser.add_argument("--metrics", type=str, metavar="FILENAME", help="periodically write latency metrics to this file")
+    parser.add_argument("--metrics-format", choices=["json", "prometheus"], default="json", help="format of the metrics file")
+    parser.add_argument("--metrics-interval", type=float, default=5, help="seconds between metrics writes")
+    parser.add_argument("--hud", action="store_true", help="show latency metrics over the video")
+    parser.add_argument("--renderer", choices=["pil", "atlas"], default="pil",
+                        help="draw captions with Pillow, or compose them from pre-rasterized glyphs")
+    parser.add_argument("--layout", choices=["wrap", "words"], default="wrap",
+                        help="wrap the whole caption on every update, or lay out words incrementally and scroll finished lines")
+    parser.add_argument("--display-scale", type=float, default=1, help="resize the video window by this much, e.g. 0.5 for a 4K camera")
+    args, remaining = parser.parse_known_args()
+    # everything else is for SpeechToText
+    sys.argv[1:] = remaining
 
-# run these three functions simultaneously
-video_captions_thread = Thread(target=transcriber.videoCaptioning)
-stt_to_captions_thread = Thread(target=transcriber.speechToText)
-stt_thread = Thread(target=stt.run)
+    if args.hud:
+        metrics.enable()
+    if args.metrics:
+        metrics.start_dumping(args.metrics, args.metrics_interval, args.metrics_format)
 
+    if args.pipeline == "processes":
+        pipeline = ProcessPipeline()
+        stt, encoder = pipeline, pipeline
+        pipeline.start()
+        stt_thread = Thread(target=pipeline.run, daemon=True)
+    else:
+        stt = SpeechToText()
+        encoder = BrailleEncoder(incremental=True)
+        stt_thread = Thread(target=stt.run)
 
-video_captions_thread.start() # takes a second to load
-stt_to_captions_thread.start()
-stt_thread.start()
+    threads = [stt_thread]
+
+    if args.srt or args.vtt or args.brf:
+        # finished sentences only, so a plain encoder is enough
+        subtitles = SubtitleWriter(pipeline if args.pipeline == "processes" else BrailleEncoder(), args.srt, args.vtt, args.brf)
+        threads.append(Thread(target=subtitles.follow, args=(stt.channel,)))
+
+    if not args.no_video:
+        transcriber = BrailleVideoCaptions(encoder, stt, args.renderer, args.layout)
+        transcriber.hud = args.hud
+        transcriber.display_scale = args.display_scale
+
+        # run these three functions simultaneously
+        video_captions_thread = Thread(target=transcriber.videoCaptioning)
+        stt_to_captions_thread = Thread(target=transcriber.speechToText)
+        threads = [video_captions_thread, stt_to_captions_thread] + threads
+
+
+    for thread in threads:
+        thread.start() # video takes a second to load
+
+    if args.no_video:
+        try:
+            while stt_thread.is_alive():
+                stt_thread.join(0.5)
+        except KeyboardInterrupt:
+            stt.terminate()
+    else:
+        # closing the video stops recognition too
+        video_captions_thread.join()
+
+    if args.metrics:
+        metrics.stop_dumping()
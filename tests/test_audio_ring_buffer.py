@@ -0,0 +1,43 @@
+import numpy as np
+
+from AudioRingBuffer import AudioRingBuffer
+
+
+def block(value, frames=4):
+    return np.full(frames, value, dtype=np.int16).tobytes()
+
+
+def test_drop_oldest_keeps_the_block_being_read():
+    ring = AudioRingBuffer(4, 4, policy="drop_oldest")
+    for i in range(4):
+        ring.put(block(i))
+    _, samples = ring.get()
+    # 3 slots unread and 1 held by the reader, so this drops block 1
+    ring.put(block(99))
+    assert samples.tolist() == [0, 0, 0, 0]
+    assert ring.dropped == 1
+    assert [ring.get()[1][0] for _ in range(ring.qsize())] == [2, 3, 99]
+
+
+def test_coalesce_keeps_the_block_being_read():
+    ring = AudioRingBuffer(4, 4, policy="coalesce", slot_blocks=1)
+    for i in range(4):
+        ring.put(block(i))
+    _, samples = ring.get()
+    # the newest slot has no room left, so this drops block 1
+    ring.put(block(99))
+    assert samples.tolist() == [0, 0, 0, 0]
+    assert ring.dropped == 1
+    assert [ring.get()[1][0] for _ in range(ring.qsize())] == [2, 3, 99]
+
+
+def test_coalesce_only_once_every_slot_is_full():
+    ring = AudioRingBuffer(3, 4, policy="coalesce", slot_blocks=2)
+    for i in range(3):
+        ring.put(block(i))
+    assert ring.qsize() == 3
+    assert ring.coalesced == 0
+    ring.put(block(3))
+    assert ring.qsize() == 3
+    assert ring.coalesced == 1
+    assert [ring.get()[1].tolist() for _ in range(3)] == [[0] * 4, [1] * 4, [2] * 4 + [3] * 4]